@@ -0,0 +1,95 @@
+"""
+Regression benchmark for the player rotation / substitution analyses.
+
+Builds synthetic seasons for one team with a large squad and times loading
+(_set_match_data) and profiling at growing match counts. Exits non-zero if
+either step grows clearly faster than linearly.
+
+    python -m benchmarks.bench_player_rotations
+    python benchmarks/bench_player_rotations.py
+"""
+import random
+import os
+import sys
+import time
+
+# Also runnable as a script: import the app modules from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from team_analysis import EnhancedTeamTacticalPredictor
+
+MATCH_COUNTS = [100, 200, 400, 800, 1600]
+SQUAD_SIZE = 40
+BENCH_SIZE = 12
+SUBSTITUTIONS = 5
+# Allowed slack over perfectly linear growth between the smallest and largest run
+LINEAR_TOLERANCE = 1.5
+
+
+def synthetic_matches(n_matches, team_name='Bench FC', seed=0):
+    rng = random.Random(seed)
+    squad = [{'id': str(100000 + i), 'name': f'Player {i}', 'position': rng.choice(['GK', 'CB', 'CM', 'ST'])}
+             for i in range(SQUAD_SIZE)]
+    matches = []
+    for i in range(n_matches):
+        picked = rng.sample(squad, 11 + BENCH_SIZE)
+        lineup = [dict(p, rating=round(rng.uniform(5.5, 8.5), 2), minutes=90, goals=rng.randint(0, 1), assists=0, xG=0.1)
+                  for p in picked[:11]]
+        bench = [dict(p, rating=round(rng.uniform(5.5, 8.5), 2), minutes=20, goals=0, assists=0, xG=0.0)
+                 for p in picked[11:]]
+        subs = [{'player_id': p['id'], 'player_name': p['name'], 'minute': rng.randint(46, 89)}
+                for p in bench[:SUBSTITUTIONS]]
+        home = i % 2 == 0
+        side, other = ('home', 'away') if home else ('away', 'home')
+        matches.append({
+            'match_id': str(i),
+            'date': f'2025-{1 + i % 12:02d}-{1 + i % 28:02d}T15:00:00.000Z',
+            'league': 'Bench League',
+            'round': str(i),
+            f'{side}_team': team_name,
+            f'{other}_team': f'Opponent {i % 20}',
+            'home_score': rng.randint(0, 3),
+            'away_score': rng.randint(0, 3),
+            f'{side}_formation': rng.choice(['4-4-2', '4-3-3', '3-5-2']),
+            f'{other}_formation': '4-4-2',
+            f'{side}_lineup': lineup,
+            f'{side}_subs': bench,
+            f'{other}_lineup': [],
+            f'{other}_subs': [],
+            'substitutions': {side: subs, other: []},
+            'stats': {f'{side}_ball_possession': 50.0, f'{side}_total_shots': 12.0}
+        })
+    return matches
+
+
+def run(team_name='Bench FC'):
+    rows = []
+    for n_matches in MATCH_COUNTS:
+        matches = synthetic_matches(n_matches, team_name)
+        analyzer = EnhancedTeamTacticalPredictor()
+
+        start = time.perf_counter()
+        analyzer._set_match_data(matches)
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        analyzer._compute_team_tactical_profile(team_name)
+        profile_time = time.perf_counter() - start
+
+        rows.append((n_matches, load_time, profile_time))
+        print(f"{n_matches:>6} matches | load {load_time * 1000:8.1f} ms | profile {profile_time * 1000:8.1f} ms "
+              f"| {profile_time / n_matches * 1e6:7.1f} us/match")
+
+    growth = MATCH_COUNTS[-1] / MATCH_COUNTS[0]
+    ok = True
+    for label, column in (('load', 1), ('profile', 2)):
+        ratio = rows[-1][column] / rows[0][column]
+        print(f"{label}: {growth:.0f}x matches -> {ratio:.1f}x time")
+        if ratio > growth * LINEAR_TOLERANCE:
+            print(f"❌ {label} scales worse than linear")
+            ok = False
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run() else 1)
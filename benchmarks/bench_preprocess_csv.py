@@ -0,0 +1,139 @@
+"""
+Benchmark for the column preparation of preprocess_csv (drop, merge, reorder).
+
+Builds a synthetic raw scraper dump (Unnamed index, current_club/club,
+player/player_name, comp_name, ...) and compares the single-assembly
+_prepare_player_columns with the previous step-by-step version kept below.
+Runs 10k and 100k rows and the requested size (1M by default). Exits non-zero
+if the outputs differ or the new version is clearly slower.
+
+    python -m benchmarks.bench_preprocess_csv [rows]
+    python benchmarks/bench_preprocess_csv.py [rows]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Also runnable as a script: import the app modules from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from player_data import _prepare_player_columns
+
+DEFAULT_ROWS = 1_000_000
+REPEATS = 5
+# Allowed slack (timing noise) before the new version counts as slower
+SLOWDOWN_TOLERANCE = 1.1
+
+
+def legacy_prepare_columns(df):
+    """Steps 1-5 of preprocess_csv before the single-pass rewrite"""
+    if 'Unnamed: 0' in df.columns:
+        df = df.drop(columns=['Unnamed: 0'])
+    original_cols_after_unnamed_drop = df.columns.tolist()
+
+    if 'current_club' in df.columns and 'club' in df.columns:
+        df['club_combined'] = df['current_club'].fillna(df['club'])
+        df = df.drop(columns=['current_club', 'club'])
+        df = df.rename(columns={'club_combined': 'club'})
+    elif 'current_club' in df.columns:
+        df = df.rename(columns={'current_club': 'club'})
+
+    if 'player' in df.columns and 'player_name' in df.columns:
+        df['player_name_combined'] = df['player_name'].fillna(df['player'])
+        df = df.drop(columns=['player', 'player_name'])
+        df = df.rename(columns={'player_name_combined': 'player_name'})
+    elif 'player' in df.columns:
+        df = df.rename(columns={'player': 'player_name'})
+
+    if 'comp_name' in df.columns:
+        df = df.rename(columns={'comp_name': 'secondary_comp_name'})
+
+    front_columns = [
+        'league_name', 'data_type', 'club', 'player_name', 'position', 'age',
+        'comp_url', 'player_url', 'injury', 'player_market_value',
+        'country', 'nationality', 'second_nationality', 'league_id'
+    ]
+    current_columns = df.columns.tolist()
+    end_columns = []
+    for col in original_cols_after_unnamed_drop:
+        mapped_col = col
+        if col == 'current_club' or col == 'club':
+            mapped_col = 'club'
+        elif col == 'player' or col == 'player_name':
+            mapped_col = 'player_name'
+        elif col == 'comp_name':
+            mapped_col = 'secondary_comp_name'
+        if mapped_col not in front_columns and mapped_col in current_columns and mapped_col not in end_columns:
+            end_columns.append(mapped_col)
+    front_columns_filtered = [col for col in front_columns if col in df.columns]
+    return df.reindex(columns=front_columns_filtered + end_columns)
+
+
+def synthetic_raw_csv(n_rows, seed=0):
+    """Raw scraper layout: injuries rows fill current_club/player, suspensions club/player_name"""
+    rng = np.random.default_rng(seed)
+
+    def pick(values, missing=0.0):
+        column = pd.Series(np.asarray(values, dtype=object)[rng.integers(0, len(values), n_rows)], dtype='str')
+        return column.mask(rng.random(n_rows) < missing) if missing else column
+
+    injuries = rng.random(n_rows) < 0.6
+    clubs = pick([f'Club {i}' for i in range(400)])
+    names = pick([f'Player {i}' for i in range(50_000)])
+    return pd.DataFrame({
+        'Unnamed: 0': np.arange(n_rows),
+        'league_name': pick([f'League {i}' for i in range(25)]),
+        'data_type': pd.Series(np.where(injuries, 'injuries', 'suspensions'), dtype='str'),
+        'current_club': clubs.where(injuries),
+        'player': names.where(injuries),
+        'position': pick(['Goalkeeper', 'Centre-Back', 'Central Midfield', 'Centre-Forward']),
+        'age': rng.integers(17, 38, n_rows),
+        'injury': pick(['Knee injury', 'Hamstring injury', 'Ankle injury'], missing=0.4),
+        'player_market_value': rng.integers(1, 400, n_rows) * 25_000.0,
+        'comp_name': pick([f'Competition {i}' for i in range(25)]),
+        'club': clubs.mask(injuries),
+        'player_name': names.mask(injuries),
+        'reason': pick(['Red card suspension', 'Yellow card suspension'], missing=0.6),
+        'matches_missed': rng.integers(0, 5, n_rows).astype(float),
+    })
+
+
+def best_time(fn, df):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(df)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(n_rows=DEFAULT_ROWS):
+    ok = True
+    for size in sorted({10_000, 100_000, n_rows}):
+        df = synthetic_raw_csv(size)
+
+        # the synthetic input has 'Unnamed: 0', so the legacy version never assigns into df itself
+        expected = legacy_prepare_columns(df)
+        result = _prepare_player_columns(df)
+        try:
+            pd.testing.assert_frame_equal(expected, result)
+        except AssertionError as e:
+            print(f"❌ {size:,} rows: outputs differ: {e}")
+            ok = False
+            continue
+
+        legacy_time = best_time(legacy_prepare_columns, df)
+        new_time = best_time(_prepare_player_columns, df)
+        print(f"{size:>9,} rows ({df.memory_usage(deep=True).sum() / 1e6:5.0f} MB) | legacy {legacy_time * 1000:7.1f} ms "
+              f"| new {new_time * 1000:7.1f} ms | {legacy_time / new_time:.1f}x")
+        if new_time > legacy_time * SLOWDOWN_TOLERANCE:
+            print(f"❌ new version is slower at {size:,} rows")
+            ok = False
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS) else 1)
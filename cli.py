@@ -0,0 +1,211 @@
+"""
+Headless entry point for the team analysis, for cron jobs and other services.
+Only imports team_analysis and player_data (no Streamlit), and prefers a local snapshot.
+
+    python cli.py --list-teams
+    python cli.py --team "Energie Cottbus" --format text
+    python cli.py --all --format csv --output players.csv
+    python cli.py --snapshot pkl1.pkl --all --format json
+    python cli.py --all --export reports.zip --workers 4
+    python cli.py --team "SC Verl" --player-data fdmbl2.csv
+    python cli.py --append matchday.json
+    python cli.py --team "SC Verl" --last 5 --venue home
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+
+import pandas as pd
+
+from player_data import PlayerAvailability, read_player_csv
+from team_analysis import (
+    DEFAULT_JSON_URL, SNAPSHOT_PATH, ConsoleReporter, EnhancedTeamTacticalPredictor, export_team_reports
+)
+
+
+def load_analyzer(args):
+    """Load from an explicit snapshot, or from the source (local snapshot first, then JSON)"""
+    analyzer = EnhancedTeamTacticalPredictor(reporter=ConsoleReporter(verbose=not args.quiet, stream=sys.stderr))
+    if args.snapshot:
+        loaded = analyzer.load_snapshot(args.snapshot)
+    else:
+        # the local snapshot is only used while the source still has the same ETag (or is unreachable)
+        loaded = analyzer.load_optimized_data(
+            args.source, snapshot_path=None if args.no_snapshot else SNAPSHOT_PATH, use_snapshot=not args.no_snapshot,
+            revalidate_snapshot=True
+        )
+    return analyzer if loaded else None
+
+
+def load_availability(args, analyzer):
+    """Injuries/suspensions from --player-data joined to the match-data squads, or None"""
+    if not args.player_data:
+        return None
+    df, success, message = read_player_csv(
+        args.player_data, reporter=ConsoleReporter(verbose=not args.quiet, stream=sys.stderr)
+    )
+    if not success:
+        print(f"❌ {message}", file=sys.stderr)
+        return None
+    return PlayerAvailability(df, analyzer)
+
+
+def append_matches(args, analyzer):
+    """Merge the matches of --append into the analyzer and refresh the snapshot it came from"""
+    with open(args.append, encoding='utf-8') as f:
+        payload = json.load(f)
+    summary = analyzer.append_matches(payload['matches'] if isinstance(payload, dict) else payload)
+    print(f"✅ {summary['added']} new, {summary['updated']} corrected, {summary['unchanged']} unchanged matches "
+          f"({len(summary['teams'])} teams affected)", file=sys.stderr)
+    if args.snapshot or args.no_snapshot:
+        snapshot_path = args.snapshot
+    elif analyzer.source != args.source:
+        # e.g. the bundled fallback: saved as the source's snapshot, it would be served instead of the source
+        print(f"⚠️ Not updating {SNAPSHOT_PATH}: the data came from {analyzer.loaded_from}, not {args.source}",
+              file=sys.stderr)
+        snapshot_path = None
+    else:
+        snapshot_path = SNAPSHOT_PATH
+    if snapshot_path and (summary['added'] or summary['updated']):
+        analyzer.save_snapshot(snapshot_path, source=analyzer.source)
+
+
+def resolve_teams(analyzer, requested):
+    """Match requested team names exactly, then case-insensitively; unknown names are reported and skipped"""
+    by_lower = {name.lower(): name for name in analyzer.team_names}
+    teams = []
+    for name in requested:
+        if name in analyzer.team_match_index:
+            teams.append(name)
+        elif name.lower() in by_lower:
+            teams.append(by_lower[name.lower()])
+        else:
+            print(f"❌ No data found for {name}", file=sys.stderr)
+    return teams
+
+
+def profile_summary(team_data):
+    """JSON-friendly view of a profile (the raw match list is reduced to a count)"""
+    summary = {key: value for key, value in team_data.items() if key != 'matches'}
+    summary['matches'] = len(team_data['matches'])
+    return summary
+
+
+def window_args(args):
+    """Profile window keyword arguments from --last/--since/--until/--venue (empty for whole-season profiles)"""
+    window = {'last_n': args.last, 'date_from': args.since, 'date_to': args.until, 'venue': args.venue}
+    return {key: value for key, value in window.items() if value is not None}
+
+
+def render(analyzer, teams, output_format, availability=None, window=None):
+    if window:
+        profiles = {team: analyzer.analyze_team_tactical_profile(team, **window) for team in teams}
+        profiles = {team: team_data for team, team_data in profiles.items() if team_data}
+    else:
+        profiles = analyzer.analyze_teams(teams)
+    team_availability = {team: availability.for_team(team) if availability else None for team in teams}
+    if output_format == 'text':
+        return "\n\n".join(
+            analyzer.create_team_report(team, profiles[team], availability=team_availability[team])
+            if team in profiles else f"❌ No data found for {team}"
+            for team in teams
+        ) + "\n"
+    if output_format == 'csv':
+        tables = [
+            analyzer.create_team_player_table(profiles[team], availability=team_availability[team]).assign(Team=team)
+            for team in teams if team in profiles
+        ]
+        table = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+        if 'Team' in table.columns:
+            table = table[['Team'] + [col for col in table.columns if col != 'Team']]
+        return table.to_csv(index=False)
+    return json.dumps(
+        {
+            team: {
+                'report': analyzer.create_team_report(team, profiles[team], availability=team_availability[team]),
+                'profile': profile_summary(profiles[team])
+            }
+            for team in teams if team in profiles
+        },
+        ensure_ascii=False,
+        indent=2,
+        default=lambda value: value.item() if hasattr(value, 'item') else str(value)
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate team tactical reports without the Streamlit UI.")
+    source = parser.add_argument_group("data source")
+    source.add_argument("--snapshot", help="load this snapshot file only (e.g. pkl1.pkl)")
+    source.add_argument("--source", default=DEFAULT_JSON_URL, help="JSON URL or path (default: %(default)s)")
+    source.add_argument("--no-snapshot", action="store_true",
+                        help="skip the local snapshot cache (and the bundled fallback) for --source")
+    source.add_argument("--player-data", help="injuries/suspensions CSV (path or URL) to mark unavailable players")
+    source.add_argument("--append", metavar="JSON",
+                        help="merge new or corrected matches (list or {'matches': [...]}) and update the snapshot")
+
+    selection = parser.add_argument_group("teams")
+    selection.add_argument("--team", action="append", default=[], help="team to report on (repeatable)")
+    selection.add_argument("--all", action="store_true", help="report on every team")
+    selection.add_argument("--list-teams", action="store_true", help="print the available team names and exit")
+
+    window = parser.add_argument_group("match window (text/csv/json output)")
+    window.add_argument("--last", type=int, metavar="N", help="only each team's last N matches")
+    window.add_argument("--since", metavar="YYYY-MM-DD", help="only matches on or after this date")
+    window.add_argument("--until", metavar="YYYY-MM-DD", help="only matches on or before this date")
+    window.add_argument("--venue", choices=["home", "away"], help="only home or away matches")
+
+    output = parser.add_argument_group("output")
+    output.add_argument("--format", choices=["text", "csv", "json"], default="text")
+    output.add_argument("--output", help="write to this file instead of stdout")
+    output.add_argument("--export", help="write one report + CSV per team into this directory or .zip")
+    output.add_argument("--workers", type=int, help="process pool size for --export (default: CPU count)")
+    output.add_argument("--quiet", action="store_true", help="suppress loading progress on stderr")
+    args = parser.parse_args(argv)
+    window = window_args(args)
+    if window and args.export:
+        parser.error("--last/--since/--until/--venue cannot be combined with --export")
+    if args.last is not None and args.last < 0:
+        parser.error("--last must not be negative")
+
+    analyzer = load_analyzer(args)
+    if analyzer is None:
+        return 1
+
+    if args.append:
+        append_matches(args, analyzer)
+
+    if args.list_teams:
+        print("\n".join(analyzer.team_names))
+        return 0
+
+    teams = list(analyzer.team_names) if args.all else resolve_teams(analyzer, args.team)
+    if not teams:
+        if args.append:
+            return 0
+        parser.error("choose teams with --team NAME or --all")
+
+    availability = load_availability(args, analyzer)
+
+    if args.export:
+        exported = export_team_reports(
+            analyzer, args.export, team_names=teams, workers=args.workers,
+            availability=availability.by_team if availability else None,
+            # the CLI is single-threaded, so the workers can inherit the analyzer by fork
+            start_method='fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+        )
+        print(f"✅ Wrote {exported} team reports to {args.export}", file=sys.stderr)
+        return 0
+
+    result = render(analyzer, teams, args.format, availability, window)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(result)
+    else:
+        sys.stdout.write(result)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Lets pytest import the app modules (team_analysis, player_data, cli) from the repo root."""
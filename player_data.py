@@ -0,0 +1,1013 @@
+"""
+Player-data side of the app (the injuries/suspensions CSV shown in the Player Data tab).
+Importable without Streamlit.
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import requests
+from pandas.api.types import union_categoricals
+
+from team_analysis import ConsoleReporter, SharedResource
+
+
+def _report(reporter, message):
+    """Pass a progress message to the reporter (st or a team_analysis.ConsoleReporter), if any"""
+    if reporter is not None:
+        reporter.write(message)
+
+
+def preprocess_csv(df, reporter=None):
+    """
+    Preprocessing function to clean and transform the uploaded CSV data
+    (progress messages go to reporter, if given; the memory note is also in the message)
+    """
+    try:
+        _report(reporter, "Starting CSV preprocessing...")
+        df = _prepare_player_columns(df)
+
+        # 6. Compact schema: categoricals, small numeric dtypes, URLs as IDs + template
+        df, memory_before, memory_after = compact_player_table(df)
+        memory_note = f"Memory: {memory_before / 1e6:.2f} MB -> {memory_after / 1e6:.2f} MB"
+        _report(reporter, memory_note)
+
+        # st.write("CSV preprocessing completed successfully!") # Removed for cleaner Streamlit output
+        return df, True, f"Preprocessing completed successfully! {memory_note}"
+
+    except Exception as e:
+        error_msg = f"Error during preprocessing: {str(e)}"
+        # st.error(error_msg) # Removed for cleaner Streamlit output
+        return df, False, error_msg
+
+
+# Leading columns of the preprocessed table, in this order when present
+FRONT_COLUMNS = [
+    'league_name', 'data_type', 'club', 'player_name', 'position', 'age',
+    'comp_url', 'player_url', 'injury', 'player_market_value',
+    'country', 'nationality', 'second_nationality', 'league_id'
+]
+# Scraper index artifact
+DROPPED_COLUMNS = ('Unnamed: 0',)
+# Output column -> source columns; the first non-missing value wins
+MERGED_COLUMNS = {
+    'club': ('current_club', 'club'),
+    'player_name': ('player_name', 'player'),
+    'secondary_comp_name': ('comp_name',),
+}
+_MERGE_TARGET = {source: output for output, sources in MERGED_COLUMNS.items() for source in sources}
+
+
+def player_column_plan(columns):
+    """
+    Output schema of preprocess_csv for raw CSV columns, as {output column: source
+    columns}, in output order: FRONT_COLUMNS that exist, then the remaining columns in
+    their original order. Sources of MERGED_COLUMNS are combined into one column.
+    """
+    merged = {}
+    for col in columns:
+        if col in DROPPED_COLUMNS:
+            continue
+        merged.setdefault(_MERGE_TARGET.get(col, col), []).append(col)
+    for output, sources in merged.items():
+        if len(sources) > 1:
+            if not set(sources) <= set(MERGED_COLUMNS.get(output, ())):
+                raise ValueError(f"Duplicate column after merging: {output}")
+            sources.sort(key=MERGED_COLUMNS[output].index)
+
+    plan = {col: merged[col] for col in FRONT_COLUMNS if col in merged}
+    plan.update((col, sources) for col, sources in merged.items() if col not in plan)
+    return plan
+
+
+def _prepare_player_columns(df):
+    """
+    Steps 1-5 of preprocess_csv (drop the index artifact, merge club/player/comp_name
+    columns, put them in display order), assembled into the output frame in one step
+    from player_column_plan.
+    """
+    columns = {}
+    for output, sources in player_column_plan(df.columns).items():
+        values = df[sources[0]]
+        for source in sources[1:]:
+            if values.hasnans:
+                values = values.fillna(df[source])
+        columns[output] = values
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+
+# Text columns with at most this share of distinct values become categoricals
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+# URL column -> template; each {field} is stored as column '<prefix>_<field>'
+# (player_url -> player_slug, player_id). IDs become integers.
+URL_TEMPLATES = {
+    'player_url': 'https://www.transfermarkt.com/{slug}/profil/spieler/{id}',
+}
+URL_FIELD_PATTERNS = {'id': r'\d+'}
+
+
+def _url_parts(column, template):
+    """Column names for the template fields, in template order"""
+    prefix = column[:-len('_url')] if column.endswith('_url') else column
+    return {field: f"{prefix}_{field}" for field in re.findall(r'\{(\w+)\}', template)}
+
+
+def _split_urls(values, template):
+    """Template fields per URL as a DataFrame, or None if any URL does not fit the template"""
+    pieces = re.split(r'\{(\w+)\}', template)  # literal, field, literal, field, ..., literal
+    pattern = ''.join(
+        re.escape(piece) if i % 2 == 0 else f"(?P<{piece}>{URL_FIELD_PATTERNS.get(piece, '[^/]+')})"
+        for i, piece in enumerate(pieces)
+    )
+    parts = values.str.extract(f"^{pattern}$")
+    present = values.notna()
+    if parts[present].isna().any().any():
+        return None
+    if 'id' in parts:
+        ids = pd.to_numeric(parts['id'], errors='coerce')
+        if not (ids[present].astype('int64').astype(str) == parts['id'][present]).all():
+            return None  # leading zeros etc. would not round-trip
+        parts['id'] = ids.astype('Int64')
+    return parts
+
+
+def _compact_numeric(values):
+    """Smallest nullable integer dtype for integer-valued columns, float32 when exact, else unchanged"""
+    numeric = values.dropna()
+    if len(numeric) == 0 or (numeric == numeric.round()).all():
+        low, high = (numeric.min(), numeric.max()) if len(numeric) else (0, 0)
+        for dtype, info in (('Int8', np.iinfo(np.int8)), ('Int16', np.iinfo(np.int16)), ('Int32', np.iinfo(np.int32))):
+            if info.min <= low and high <= info.max:
+                return values.astype(dtype)
+        return values.astype('Int64')
+    as_float32 = values.astype('float32')
+    if (as_float32.astype('float64')[values.notna()] == numeric).all():
+        return as_float32
+    return values
+
+
+def _is_repetitive(values):
+    return values.nunique() <= CATEGORY_MAX_UNIQUE_RATIO * len(values)
+
+
+def compact_player_table(df, split_empty_urls=False):
+    """
+    Typed, compact layout for the preprocessed player table: repetitive text columns
+    become categoricals, numeric columns the smallest exact dtype, and URL columns
+    matching URL_TEMPLATES their ID/slug parts. The source dtypes and templates are kept
+    in df.attrs so expand_player_table can rebuild the original layout for export,
+    together with memory_bytes (before, after).
+
+    split_empty_urls also splits URL columns with no values at all, so every chunk of a
+    chunked read ends up with the same columns.
+    Returns (df, bytes before, bytes after).
+    """
+    memory_before = int(df.memory_usage(deep=True).sum())
+    source_dtypes = {col: str(dtype) for col, dtype in df.dtypes.items()}
+    columns = {}
+    url_templates = {}
+    for col in df.columns:
+        values = df[col]
+        template = URL_TEMPLATES.get(col)
+        parts = _split_urls(values, template) if template and (split_empty_urls or values.notna().any()) else None
+        if parts is not None:
+            for field, part_col in _url_parts(col, template).items():
+                part = parts[field]
+                columns[part_col] = _compact_numeric(part) if field == 'id' else part.astype('category')
+            url_templates[col] = template
+        elif pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            columns[col] = _compact_numeric(values)
+        elif _is_repetitive(values):
+            columns[col] = values.astype('category')
+        else:
+            columns[col] = values
+
+    compact = pd.DataFrame(columns, index=df.index)
+    memory_after = int(compact.memory_usage(deep=True).sum())
+    compact.attrs = dict(
+        df.attrs, source_dtypes=source_dtypes, url_templates=url_templates, memory_bytes=(memory_before, memory_after)
+    )
+    return compact, memory_before, memory_after
+
+
+def _join_url_parts(df, col, template):
+    """Replace the template part columns of col by the full URLs, in the same position"""
+    parts = _url_parts(col, template)
+    if not all(part_col in df.columns for part_col in parts.values()):
+        return df
+    fields = pd.DataFrame({field: df[part_col].astype(object) for field, part_col in parts.items()})
+    urls = [
+        None if any(pd.isna(value) for value in row.values()) else template.format(**row)
+        for row in fields.to_dict('records')
+    ]
+    position = df.columns.get_loc(next(iter(parts.values())))
+    df = df.drop(columns=list(parts.values()))
+    df.insert(position, col, pd.Series(urls, index=df.index, dtype=object))
+    return df
+
+
+def expand_player_table(df):
+    """Inverse of compact_player_table (same columns, order and dtypes as before it), e.g. for CSV export"""
+    source_dtypes = df.attrs.get('source_dtypes')
+    if not source_dtypes:
+        return df
+    expanded = df
+    for col, template in df.attrs.get('url_templates', {}).items():
+        expanded = _join_url_parts(expanded, col, template)
+    restore = {col: dtype for col, dtype in source_dtypes.items() if col in expanded.columns}
+    return expanded.astype(restore)[[col for col in source_dtypes if col in expanded.columns]]
+
+
+EXPORT_FORMATS = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+
+
+def available_export_formats():
+    """The EXPORT_FORMATS usable in this environment (Parquet needs pyarrow)"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return [file_format for file_format in EXPORT_FORMATS if file_format != 'parquet']
+    return list(EXPORT_FORMATS)
+
+
+def export_player_table(df, file_format='csv'):
+    """The table in its original layout (see expand_player_table) as CSV or Parquet bytes"""
+    expanded = expand_player_table(df)
+    if file_format == 'parquet':
+        buffer = io.BytesIO()
+        expanded.to_parquet(buffer, index=False)
+        return buffer.getvalue()
+    if file_format == 'csv':
+        return expanded.to_csv(index=False).encode('utf-8')
+    raise ValueError(f"unsupported export format {file_format!r} (expected one of {sorted(EXPORT_FORMATS)})")
+
+
+# Player Data tab columns, in display order: source column -> label
+DISPLAY_COLUMNS = {
+    'player_name': 'Player', 'club': 'Club', 'position': 'Position', 'age': 'Age',
+    'nationality': 'Nationality', 'league_name': 'League', 'player_market_value': 'Market Value',
+    'data_type': 'Type', 'injury': 'Injury',
+}
+
+
+def format_market_values(values):
+    """
+    '€12.5M' per market value ('-' when missing or not positive), as a categorical.
+    Each distinct value is formatted once and the labels are taken by code.
+    """
+    codes, uniques = pd.factorize(values)
+    amounts = pd.to_numeric(pd.Series(uniques), errors='coerce').to_numpy(dtype=float)
+    labels = np.full(len(amounts) + 1, '-', dtype=object)
+    positive = amounts > 0
+    labels[:-1][positive] = np.char.mod('€%.1fM', amounts[positive] / 1_000_000)
+    # several values can round to the same label; categories must be unique
+    label_codes, categories = pd.factorize(labels)
+    return pd.Series(
+        pd.Categorical.from_codes(label_codes[codes], categories=categories), index=values.index, name=values.name
+    )
+
+
+class PlayerDisplayProjection:
+    """
+    Display view of the preprocessed player table (labelled DISPLAY_COLUMNS).
+
+    Columns are formatted for display once per table and only when first shown
+    (see FORMATTERS); project() then takes just the requested rows, so a page costs
+    a slice of the shown columns and no copy or rename of the table.
+    """
+
+    FORMATTERS = {'player_market_value': format_market_values}
+    # shown (unlabelled) when the table has none of the display columns
+    FALLBACK_COLUMN_COUNT = 6
+
+    def __init__(self, df, columns=None):
+        self.df = df
+        columns = DISPLAY_COLUMNS if columns is None else columns
+        self.labels = {col: label for col, label in columns.items() if col in df.columns}
+        if not self.labels:
+            self.labels = {col: col for col in df.columns[:self.FALLBACK_COLUMN_COUNT]}
+        self._formatted = {}
+        self._lock = threading.Lock()
+
+    def column(self, col):
+        """Display values of one column for the whole table"""
+        formatter = self.FORMATTERS.get(col)
+        if formatter is None:
+            return self.df[col]
+        with self._lock:
+            if col not in self._formatted:
+                self._formatted[col] = formatter(self.df[col])
+            return self._formatted[col]
+
+    def project(self, positions, columns=None):
+        """Labelled display frame of the rows at positions, for columns (default: all display columns)"""
+        columns = list(self.labels) if columns is None else [col for col in columns if col in self.labels]
+        return pd.DataFrame(
+            {self.labels[col]: self.column(col).iloc[positions].reset_index(drop=True) for col in columns},
+            columns=[self.labels[col] for col in columns]
+        )
+
+
+# Rows per chunk for read_player_csv
+CSV_CHUNK_ROWS = 100_000
+
+# Explicit dtypes for the scraper columns, so chunks parse alike (numeric columns as
+# float64 whatever a chunk's missing values); unknown columns are inferred per chunk.
+# The spell dates ('Sep 1, 2025') stay text, even where a file leaves them all empty.
+PLAYER_CSV_DTYPES = {
+    **dict.fromkeys(
+        ['Unnamed: 0', 'age', 'player_market_value', 'matches_missed', 'yellow_cards'],
+        'float64'
+    ),
+    **dict.fromkeys(
+        ['league_name', 'data_type', 'club', 'current_club', 'player', 'player_name', 'position',
+         'comp_url', 'player_url', 'injury', 'country', 'nationality', 'second_nationality',
+         'league_id', 'competition', 'reason', 'comp_name', 'secondary_comp_name',
+         'since', 'until', 'injured_since', 'injured_until'],
+        'str'
+    ),
+}
+
+
+def _concat_compact_chunks(chunks):
+    """
+    Concatenate compacted chunks: categoricals are merged (union of categories); a text
+    column categorical in only some chunks is decided again on the whole column, so the
+    result has the layout compact_player_table would give the full table.
+    """
+    url_templates = {}
+    for chunk in chunks:
+        url_templates.update(chunk.attrs.get('url_templates', {}))
+    for col, template in url_templates.items():
+        # a chunk that did not fit the template kept the full URL: use full URLs everywhere
+        if any(col in chunk.columns for chunk in chunks):
+            chunks = [_join_url_parts(chunk, col, template) for chunk in chunks]
+
+    columns = {}
+    for col in chunks[0].columns:
+        pieces = [chunk[col] for chunk in chunks]
+        categorical = [isinstance(piece.dtype, pd.CategoricalDtype) for piece in pieces]
+        if all(categorical):
+            columns[col] = pd.Series(union_categoricals(pieces, ignore_order=True))
+        elif any(categorical):
+            values = pd.concat([
+                piece.astype(piece.cat.categories.dtype) if is_categorical else piece
+                for piece, is_categorical in zip(pieces, categorical)
+            ], ignore_index=True)
+            columns[col] = values.astype('category') if _is_repetitive(values) else values
+        else:
+            values = pd.concat(pieces, ignore_index=True)
+            numeric = pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)
+            if numeric:
+                columns[col] = _compact_numeric(values)
+            else:
+                columns[col] = values.astype('category') if _is_repetitive(values) else values
+    return pd.DataFrame(columns), {col: t for col, t in url_templates.items() if col not in columns}
+
+
+def read_player_csv(source, chunksize=CSV_CHUNK_ROWS, progress=None, reporter=None):
+    """
+    Chunked alternative to pd.read_csv + preprocess_csv for large scraper dumps: each
+    chunk is parsed with PLAYER_CSV_DTYPES, prepared and compacted on its own, so only
+    one raw chunk is in memory at a time.
+
+    progress(fraction, rows) is called after each chunk; fraction is None when the size
+    of source is unknown. Progress messages go to reporter (nowhere by default).
+    Returns (df, success, message) like preprocess_csv.
+    """
+    try:
+        _report(reporter, "Starting chunked CSV preprocessing...")
+        total_bytes = getattr(source, 'size', None)
+        if total_bytes is None and isinstance(source, (str, os.PathLike)) and os.path.exists(source):
+            total_bytes = os.path.getsize(source)
+
+        chunks = []
+        memory_before = 0
+        rows = 0
+        int_columns = {}
+        source_dtypes = None
+        for raw in pd.read_csv(source, chunksize=chunksize, dtype=PLAYER_CSV_DTYPES):
+            memory_before += int(raw.memory_usage(deep=True).sum())
+            prepared = _prepare_player_columns(raw)
+            del raw
+            if source_dtypes is None:
+                source_dtypes = {col: str(dtype) for col, dtype in prepared.dtypes.items()}
+            # float columns that a single full read would have parsed as int64
+            for col in prepared.columns:
+                if source_dtypes[col] == 'float64':
+                    values = prepared[col]
+                    whole = values.notna().all() and (values == values.round()).all()
+                    int_columns[col] = int_columns.get(col, True) and bool(whole)
+
+            compact, _, _ = compact_player_table(prepared, split_empty_urls=True)
+            chunks.append(compact)
+            rows += len(compact)
+            if progress is not None:
+                position = source.tell() if hasattr(source, 'tell') and total_bytes else None
+                progress(min(1.0, position / total_bytes) if position is not None else None, rows)
+
+        if not chunks:
+            return preprocess_csv(pd.DataFrame(), reporter=reporter)
+
+        df, url_templates = _concat_compact_chunks(chunks)
+        source_dtypes.update({col: 'int64' for col, whole in int_columns.items() if whole})
+        memory_after = int(df.memory_usage(deep=True).sum())
+        df.attrs = dict(
+            source_dtypes=source_dtypes, url_templates=url_templates, memory_bytes=(memory_before, memory_after)
+        )
+        memory_note = f"Memory: {memory_before / 1e6:.2f} MB -> {memory_after / 1e6:.2f} MB"
+        _report(reporter, memory_note)
+        return df, True, f"Preprocessing completed successfully! {len(df)} rows in {len(chunks)} chunks. {memory_note}"
+
+    except Exception as e:
+        error_msg = f"Error during preprocessing: {str(e)}"
+        return None, False, error_msg
+
+
+DEFAULT_PLAYER_CSV_URL = "https://raw.githubusercontent.com/sznajdr/cmpo/main/fdmbl.csv"
+
+# Local columnar cache of the preprocessed player table (Arrow IPC / Feather, uncompressed
+# so it can be memory-mapped), with the source, its hash and ETag in the schema metadata
+PLAYER_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'player_data.feather')
+PLAYER_CACHE_FORMAT_VERSION = 1
+PLAYER_CACHE_METADATA_KEY = b'cmpo_player_cache'
+
+
+def write_player_cache(path, df, source=None, source_hash=None, etag=None):
+    """Write the preprocessed table to a Feather cache file atomically"""
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = json.dumps({
+        'format_version': PLAYER_CACHE_FORMAT_VERSION,
+        'source': source,
+        'source_hash': source_hash,
+        'etag': etag,
+        'created_at': datetime.now().isoformat(),
+        'attrs': df.attrs
+    })
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), PLAYER_CACHE_METADATA_KEY: metadata})
+    tmp_path = f"{path}.tmp"
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+
+
+def read_player_cache(path):
+    """
+    Read a cache written by write_player_cache, memory-mapped. Returns (df, metadata);
+    raises ValueError when the file is not a valid cache.
+    """
+    import pyarrow.feather as feather
+
+    try:
+        table = feather.read_table(path, memory_map=True)
+    except Exception as e:
+        raise ValueError(f"not a Feather file: {e}") from e
+    raw_metadata = (table.schema.metadata or {}).get(PLAYER_CACHE_METADATA_KEY)
+    if raw_metadata is None:
+        raise ValueError("no player cache metadata")
+    metadata = json.loads(raw_metadata)
+    if metadata.get('format_version') != PLAYER_CACHE_FORMAT_VERSION:
+        raise ValueError(f"unsupported cache version {metadata.get('format_version')} "
+                         f"(expected {PLAYER_CACHE_FORMAT_VERSION})")
+    df = table.to_pandas(split_blocks=True)
+    attrs = metadata.pop('attrs', {})
+    if 'memory_bytes' in attrs:
+        attrs['memory_bytes'] = tuple(attrs['memory_bytes'])
+    df.attrs = attrs
+    return df, metadata
+
+
+def fetch_player_csv(source, etag=None):
+    """
+    Raw CSV bytes of a URL or local path, as (bytes, etag); (None, etag) when the server
+    answers 304 Not Modified to the If-None-Match etag.
+    """
+    if not source.startswith(('http://', 'https://')):
+        with open(source, 'rb') as f:
+            return f.read(), None
+    response = requests.get(source, timeout=60, headers={'If-None-Match': etag} if etag else {})
+    if response.status_code == 304:
+        return None, etag
+    response.raise_for_status()
+    return response.content, response.headers.get('ETag')
+
+
+class PlayerDataset(SharedResource):
+    """
+    Process-wide preprocessed player table for the default CSV, shared by every session;
+    see SharedResource for the loading and refresh rules.
+
+    A cold start reads the local cache (memory-mapped) and refreshes from the source
+    right away in the background; without a usable cache the first load is a fetch.
+    Fetches use the cached ETag and only re-run preprocessing when the downloaded bytes
+    hash differently. If the source is unreachable the last good table stays in use,
+    even when the cache was built from another source.
+
+    Messages go to reporter (default: progress dropped, warnings on stderr); background
+    refreshes always use the default.
+    """
+
+    def __init__(self, csv_url, cache_path=PLAYER_CACHE_PATH, ttl_seconds=900, reporter=None, retry_seconds=60):
+        super().__init__(ttl_seconds=ttl_seconds, retry_seconds=retry_seconds)
+        self.csv_url = csv_url
+        self.cache_path = cache_path
+        self.reporter = reporter or ConsoleReporter(verbose=False)
+        # Source state of the current table; only the (single) loading thread touches these
+        self.source_hash = None
+        self.etag = None
+
+    @property
+    def df(self):
+        return self.value
+
+    def _load(self):
+        df = self._read_cache()
+        if df is not None:
+            return df, False
+        return self._fetch(self.reporter), True
+
+    def _refresh(self, current):
+        # No session to report to from this thread: progress is dropped, warnings go to stderr
+        return self._fetch(ConsoleReporter(verbose=False))
+
+    def _read_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return None
+        try:
+            df, metadata = read_player_cache(self.cache_path)
+        except Exception as e:
+            self.reporter.error(f"⚠️ Ignoring player cache {self.cache_path}: {str(e)}")
+            return None
+        # a cache built from another source is only kept as the fallback
+        if metadata.get('source') == self.csv_url:
+            self.source_hash = metadata.get('source_hash')
+            self.etag = metadata.get('etag')
+        self.reporter.write(f"✅ Loaded {len(df)} players from cache {self.cache_path}")
+        return df
+
+    def _fetch(self, reporter):
+        """New table (also written to the cache), or None if unchanged/unavailable"""
+        try:
+            raw, etag = fetch_player_csv(self.csv_url, self.etag)
+        except Exception as e:
+            reporter.error(f"⚠️ Could not fetch {self.csv_url}: {str(e)}")
+            return None
+        if raw is None:
+            return None
+        source_hash = hashlib.sha256(raw).hexdigest()
+        if source_hash == self.source_hash:
+            self.etag = etag
+            return None
+        df, success, message = read_player_csv(io.BytesIO(raw), reporter=reporter)
+        if not success:
+            reporter.error(f"❌ {message}")
+            return None
+        self.source_hash, self.etag = source_hash, etag
+        self._write_cache(df, reporter)
+        return df
+
+    def _write_cache(self, df, reporter):
+        if not self.cache_path:
+            return
+        try:
+            write_player_cache(self.cache_path, df, self.csv_url, self.source_hash, self.etag)
+        except Exception as e:
+            reporter.error(f"⚠️ Could not write player cache {self.cache_path}: {str(e)}")
+
+
+# Letters NFKD does not decompose into a base letter + accent
+_FOLD_TABLE = str.maketrans({
+    'ø': 'o', 'Ø': 'o', 'ł': 'l', 'Ł': 'l', 'đ': 'd', 'Đ': 'd', 'ð': 'd',
+    'æ': 'ae', 'Æ': 'ae', 'œ': 'oe', 'Œ': 'oe', 'þ': 'th', 'ı': 'i'
+})
+
+
+def normalize_name(name):
+    """Lowercase, accent-folded, whitespace-collapsed form used for name matching"""
+    if not isinstance(name, str):
+        return ''
+    if name.isascii():
+        return ' '.join(name.lower().split())
+    decomposed = unicodedata.normalize('NFKD', name.translate(_FOLD_TABLE))
+    folded = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(folded.casefold().split())
+
+
+def _substring_distance(query, text, limit):
+    """
+    Edit distance between query and the best-matching substring of text (Sellers),
+    or limit + 1 as soon as it cannot be within limit.
+    """
+    previous = [0] * (len(text) + 1)
+    for i, query_char in enumerate(query, 1):
+        current = [i] + [0] * len(text)
+        for j, text_char in enumerate(text, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (query_char != text_char))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous)
+
+
+class PlayerNameIndex:
+    """
+    Name search over one or more player sources (e.g. the CSV rows and the match-data
+    player directory), so a name typed once can be looked up in both.
+
+    Names are normalized (see normalize_name) and deduplicated; each distinct name is
+    indexed by its character bigrams. A substring query intersects the posting lists of
+    its bigrams and only verifies the few surviving names, instead of scanning every
+    row. When nothing contains the query, names sharing enough bigrams with it are
+    re-checked with a bounded edit distance, so small typos still match
+    (queries of FUZZY_MIN_LENGTH characters or more).
+    """
+
+    NGRAM = 2
+    FUZZY_MIN_LENGTH = 5
+    FUZZY_CANDIDATES = 200
+
+    def __init__(self):
+        self._name_ids = {}
+        self._names = []
+        self._labels = []
+        self._postings = {}
+        # source -> (name id per entry, key per entry)
+        self._sources = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    @property
+    def sources(self):
+        return list(self._sources)
+
+    def add(self, source, names, keys=None):
+        """
+        Index names under source; keys identify each entry in that source (row positions
+        by default). Adding to an existing source replaces it.
+        """
+        codes, uniques = pd.factorize(pd.Series(list(names), dtype=object))
+        # trailing -1 so missing names (code -1) map to "no name"
+        ids = np.array([self._intern(name) for name in uniques] + [-1], dtype=np.int64)
+        keys = np.arange(len(codes)) if keys is None else np.asarray(list(keys))
+        self._sources[source] = (ids[codes], keys)
+
+    def _intern(self, name):
+        normalized = normalize_name(name)
+        if not normalized:
+            return -1
+        name_id = self._name_ids.get(normalized)
+        if name_id is None:
+            name_id = len(self._names)
+            self._name_ids[normalized] = name_id
+            self._names.append(normalized)
+            self._labels.append(name)
+            for gram in self._ngrams(normalized):
+                self._postings.setdefault(gram, []).append(name_id)
+        return name_id
+
+    def _ngrams(self, text):
+        return {text[i:i + self.NGRAM] for i in range(len(text) - self.NGRAM + 1)}
+
+    def match_ids(self, query, fuzzy=True):
+        """Distinct-name ids containing query; typo-tolerant fallback if there are none"""
+        query = normalize_name(query)
+        if not query:
+            return np.array([], dtype=np.int64)
+
+        grams = self._ngrams(query)
+        if grams:
+            postings = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+        else:
+            candidates = range(len(self._names))
+        matches = [name_id for name_id in candidates if query in self._names[name_id]]
+
+        if not matches and fuzzy and len(query) >= self.FUZZY_MIN_LENGTH:
+            matches = self._fuzzy_ids(query, grams)
+        return np.array(sorted(matches), dtype=np.int64)
+
+    def _fuzzy_ids(self, query, grams):
+        max_typos = 1 if len(query) <= 8 else 2
+        # each edit breaks at most NGRAM of the query's n-grams
+        min_shared = max(1, len(grams) - self.NGRAM * max_typos)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        candidates = [name_id for name_id, count in shared.most_common(self.FUZZY_CANDIDATES) if count >= min_shared]
+        return [
+            name_id for name_id in candidates
+            if _substring_distance(query, self._names[name_id], max_typos) <= max_typos
+        ]
+
+    def keys(self, query, source, fuzzy=True):
+        """Keys of source entries whose name matches query"""
+        if source not in self._sources:
+            return np.array([], dtype=np.int64)
+        entry_ids, keys = self._sources[source]
+        return keys[np.isin(entry_ids, self.match_ids(query, fuzzy=fuzzy))]
+
+    def search(self, query, source=None, limit=10, fuzzy=True):
+        """
+        Matching display names, best first: exact name, then names or words starting with
+        the query, then other matches. Restricted to names present in source if given.
+        """
+        ids = self.match_ids(query, fuzzy=fuzzy)
+        if source is not None:
+            entry_ids = self._sources[source][0] if source in self._sources else np.array([], dtype=np.int64)
+            ids = ids[np.isin(ids, entry_ids)]
+        query = normalize_name(query)
+
+        def rank(name_id):
+            name = self._names[name_id]
+            return (
+                name != query,
+                not name.startswith(query),
+                not any(word.startswith(query) for word in name.split()),
+                name
+            )
+
+        return [self._labels[name_id] for name_id in sorted(ids.tolist(), key=rank)[:limit]]
+
+    def lookup(self, name):
+        """Keys per source for an exact (normalized) name, e.g. {'csv': [12], 'matches': [4711]}"""
+        name_id = self._name_ids.get(normalize_name(name))
+        if name_id is None:
+            return {}
+        found = {}
+        for source, (entry_ids, keys) in self._sources.items():
+            hits = keys[entry_ids == name_id]
+            if len(hits):
+                found[source] = hits.tolist()
+        return found
+
+
+class PlayerFilterEngine:
+    """
+    Pre-indexed filters over the preprocessed player table.
+
+    Categorical columns are encoded once into integer codes and numeric range columns
+    into sorted indexes, so a filter combination becomes one boolean mask built from
+    code comparisons and searchsorted slices. Player names go into a PlayerNameIndex
+    (source 'csv', keyed by row position). Results (row positions) are memoized per
+    filter combination; the frame itself is only sliced once, by the caller.
+
+    The widget domains come from the same indexes: the sorted values present in each
+    categorical column, the clubs per league, and the range column bounds.
+    """
+
+    CATEGORICAL_COLUMNS = ('league_name', 'data_type', 'club', 'position')
+    RANGE_COLUMNS = ('age', 'player_market_value')
+
+    def __init__(self, df, cache_size=64):
+        self.df = df
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        # column -> (codes array, {value: code})
+        self._codes = {}
+        # column -> sorted values present in it
+        self._options = {}
+        categories = {}
+        for col in self.CATEGORICAL_COLUMNS:
+            if col in df.columns:
+                categorical = pd.Categorical(df[col])
+                codes = np.asarray(categorical.codes)
+                categories[col] = categorical.categories
+                self._codes[col] = (codes, {value: code for code, value in enumerate(categorical.categories)})
+                self._options[col] = sorted(categories[col][np.unique(codes[codes >= 0])])
+
+        # league -> sorted clubs with rows in it
+        self._clubs_by_league = {}
+        if 'league_name' in self._codes and 'club' in self._codes:
+            league_codes, club_codes = self._codes['league_name'][0], self._codes['club'][0]
+            present = (league_codes >= 0) & (club_codes >= 0)
+            club_count = len(self._codes['club'][1])
+            pairs = np.unique(league_codes[present].astype(np.int64) * club_count + club_codes[present])
+            for league_code, club_code in zip(pairs // club_count, pairs % club_count):
+                self._clubs_by_league.setdefault(categories['league_name'][league_code], []).append(
+                    categories['club'][club_code]
+                )
+            for league, league_clubs in self._clubs_by_league.items():
+                league_clubs.sort()
+
+        # column -> (row positions sorted by value, sorted values, positions of missing values)
+        self._sorted = {}
+        for col in self.RANGE_COLUMNS:
+            if col in df.columns:
+                values = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+                missing = np.isnan(values)
+                present = np.flatnonzero(~missing)
+                order = present[np.argsort(values[present], kind='stable')]
+                self._sorted[col] = (order, values[order], np.flatnonzero(missing))
+
+        self.name_index = PlayerNameIndex()
+        if 'player_name' in df.columns:
+            self.name_index.add('csv', df['player_name'])
+
+    def options(self, col, league='All'):
+        """Sorted values of a categorical column for a selectbox; clubs are narrowed to league unless 'All'"""
+        if col == 'club' and league != 'All' and self._clubs_by_league:
+            return list(self._clubs_by_league.get(league, ()))
+        return list(self._options.get(col, ()))
+
+    def range_bounds(self, col):
+        """(min, max) of a range column, or None when it has no values"""
+        if col not in self._sorted or len(self._sorted[col][1]) == 0:
+            return None
+        sorted_values = self._sorted[col][1]
+        return sorted_values[0], sorted_values[-1]
+
+    def filter(self, **filters):
+        """Filtered frame for the given filters (see filter_positions)"""
+        return self.df.iloc[self.filter_positions(**filters)]
+
+    def filter_positions(self, league='All', data_type='All', club='All', positions=None,
+                         age_range=None, value_range=None, search_name=''):
+        """
+        Row positions matching all filters. 'All'/empty means no filter; ranges are
+        inclusive and keep rows with a missing value, like Series.between(...) | isna().
+        search_name matches case- and accent-insensitively anywhere in the name, with a
+        typo-tolerant fallback when no name contains it.
+        """
+        key = (league, data_type, club, tuple(sorted(positions or ())),
+               tuple(age_range) if age_range else None,
+               tuple(value_range) if value_range else None,
+               search_name or '')
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        mask = np.ones(len(self.df), dtype=bool)
+        for col, selected in (('league_name', league), ('data_type', data_type), ('club', club)):
+            if selected != 'All' and col in self._codes:
+                codes, lookup = self._codes[col]
+                mask &= codes == lookup.get(selected, -2)
+        if positions and 'position' in self._codes:
+            codes, lookup = self._codes['position']
+            mask &= np.isin(codes, [lookup[value] for value in positions if value in lookup])
+        for col, bounds in (('age', age_range), ('player_market_value', value_range)):
+            if bounds is not None and col in self._sorted:
+                mask &= self._range_mask(col, bounds)
+
+        if search_name and 'player_name' in self.df.columns:
+            name_mask = np.zeros(len(self.df), dtype=bool)
+            name_mask[self.name_index.keys(search_name, 'csv')] = True
+            mask &= name_mask
+
+        result = np.flatnonzero(mask)
+
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _range_mask(self, col, bounds):
+        order, sorted_values, missing = self._sorted[col]
+        low = np.searchsorted(sorted_values, bounds[0], side='left')
+        high = np.searchsorted(sorted_values, bounds[1], side='right')
+        mask = np.zeros(len(self.df), dtype=bool)
+        mask[order[low:high]] = True
+        mask[missing] = True
+        return mask
+
+
+# Player table data types that keep a player out of the lineup ('risk_of_suspension' is only flagged)
+UNAVAILABLE_TYPES = ('injuries', 'suspensions')
+# Club name tokens that say nothing about the club (legal forms, 'club'); numbers are dropped too
+CLUB_NAME_AFFIXES = frozenset({
+    'ac', 'afc', 'as', 'bk', 'cf', 'club', 'fc', 'fk', 'if', 'ik', 'jk', 'kv', 'sc', 'sk', 'ssv', 'sv', 'tsg', 'tsv',
+    'vfb', 'vfl',
+})
+
+
+def club_name_tokens(name):
+    """Distinctive tokens of a club name ('1.FC Schweinfurt 05' -> {'schweinfurt'})"""
+    tokens = re.split(r'\W+', normalize_name(name))
+    return frozenset(token for token in tokens if token and not token.isdigit() and token not in CLUB_NAME_AFFIXES)
+
+
+def match_club(team_name, club_tokens):
+    """
+    The club of club_tokens ({club: club_name_tokens(club)}) that team_name refers to, or None.
+    Prefers the most shared tokens, then the fewest extra ones; ties are left unresolved.
+    """
+    team_tokens = club_name_tokens(team_name)
+    best, best_score, tied = None, None, False
+    for club, tokens in club_tokens.items():
+        shared = len(team_tokens & tokens)
+        if not shared:
+            continue
+        score = (shared, -len(tokens - team_tokens), -len(team_tokens - tokens))
+        if best_score is None or score > best_score:
+            best, best_score, tied = club, score, False
+        elif score == best_score:
+            tied = True
+    return None if tied else best
+
+
+def _normalized_names(values):
+    """normalize_name per value, computed once per distinct value"""
+    codes, uniques = pd.factorize(values)
+    keys = np.array([normalize_name(value) for value in uniques] + [''], dtype=object)
+    return keys[codes]
+
+
+class PlayerAvailability:
+    """
+    Injured, suspended and at-risk players of the player table joined to the match-data
+    squads (an EnhancedTeamTacticalPredictor) for one (table, match data version).
+
+    Each match-data team is resolved to a player-table club once (match_club); the
+    squads and the table rows of the resolved clubs are then merged on (club, normalized
+    player name). for_team() is a dict lookup, so reports need no name search.
+    """
+
+    def __init__(self, df, analyzer, as_of=None):
+        self.df = df
+        self.data_version = analyzer.data_version
+        self.team_clubs = {}
+        self._by_team = {}
+        appearances = analyzer.appearance_table
+        if appearances is None or appearances.empty or not {'club', 'player_name', 'data_type'} <= set(df.columns):
+            return
+
+        clubs = df['club'].dropna().unique()
+        club_tokens = {club: club_name_tokens(club) for club in clubs}
+        for team_name in analyzer.team_names:
+            club = match_club(team_name, club_tokens)
+            if club is not None:
+                self.team_clubs[team_name] = club
+        if not self.team_clubs:
+            return
+
+        rows = df[df['club'].isin(set(self.team_clubs.values()))]
+        listed = pd.DataFrame({
+            'club': rows['club'].astype(object).to_numpy(),
+            'name_key': _normalized_names(rows['player_name']),
+            'status': rows['data_type'].astype(object).to_numpy(),
+            'reason': self._first_present(rows, ('injury', 'reason')),
+            'until': self._first_present(rows, ('injured_until', 'until')),
+            'matches_missed': rows['matches_missed'].to_numpy(dtype=float, na_value=np.nan)
+            if 'matches_missed' in rows.columns else np.nan,
+        })
+        # Drop spells that already ended; undated ones are current (the table is a snapshot)
+        until = pd.to_datetime(listed['until'], errors='coerce')
+        as_of = pd.Timestamp(as_of or datetime.now()).normalize()
+        listed = listed[(listed['name_key'] != '') & (until.isna() | (until >= as_of)).to_numpy()]
+        # One row per player: a reason to be out beats a suspension risk
+        priority = listed['status'].map({status: rank for rank, status in enumerate(UNAVAILABLE_TYPES)})
+        listed = listed.assign(priority=priority.fillna(len(UNAVAILABLE_TYPES)))
+        listed = listed.sort_values('priority', kind='stable').drop_duplicates(['club', 'name_key'])
+
+        squads = appearances[appearances['name'].notna() & (appearances['name'] != '')]
+        squads = squads.drop_duplicates(['team', 'player_id'], keep='last')
+        squads = pd.DataFrame({
+            'team': squads['team'].to_numpy(),
+            'player_id': squads['player_id'].to_numpy(),
+            'club': squads['team'].map(self.team_clubs).to_numpy(dtype=object),
+            'name_key': _normalized_names(squads['name']),
+        }).dropna(subset=['club'])
+
+        joined = squads.merge(listed, on=['club', 'name_key'])
+        for row in joined.to_dict('records'):
+            self._by_team.setdefault(row['team'], {})[row['player_id']] = {
+                'status': row['status'],
+                'unavailable': row['status'] in UNAVAILABLE_TYPES,
+                'reason': row['reason'] if isinstance(row['reason'], str) else '',
+                'until': row['until'] if isinstance(row['until'], str) else '',
+                'matches_missed': None if pd.isna(row['matches_missed']) else int(row['matches_missed']),
+            }
+
+    @staticmethod
+    def _first_present(rows, columns):
+        """Per row, the first non-missing value of columns (as text), else None"""
+        values = np.full(len(rows), None, dtype=object)
+        for col in columns:
+            if col in rows.columns:
+                # object arrays, not fillna: pandas 2.x warns about downcasting all-missing results
+                values = np.where(pd.isna(values), rows[col].to_numpy(dtype=object), values)
+        return np.array([str(value).strip() if pd.notna(value) else None for value in values], dtype=object)
+
+    @property
+    def by_team(self):
+        """{team: {player_id: record}} for every team with a listed player"""
+        return self._by_team
+
+    def for_team(self, team_name):
+        """{player_id: record} for the team's listed players (see UNAVAILABLE_TYPES)"""
+        return self._by_team.get(team_name, {})
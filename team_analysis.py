@@ -0,0 +1,2160 @@
+"""
+Match-data side of the team analysis app: loading (streamed JSON or local snapshot),
+columnar tables and the tactical analyses. Importable without Streamlit; the app
+passes `st` as the reporter so progress messages still show up in the UI.
+"""
+import bisect
+import codecs
+import hashlib
+import json
+import math
+import os
+import pickle
+import struct
+import sys
+import threading
+import tempfile
+import time
+import zipfile
+from collections import defaultdict, OrderedDict
+from collections.abc import Hashable
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import requests
+
+
+DEFAULT_JSON_URL = "https://raw.githubusercontent.com/sznajdr/cmpo/main/optimized_football_data.json"
+
+
+class ConsoleReporter:
+    """Stand-in for st.write/st.error when running outside Streamlit"""
+
+    def __init__(self, verbose=True, stream=None):
+        self.verbose = verbose
+        self.stream = stream
+
+    def write(self, message):
+        if self.verbose:
+            print(message, file=self.stream or sys.stdout)
+
+    def error(self, message):
+        print(message, file=sys.stderr)
+
+
+JSON_STREAM_CHUNK_SIZE = 1 << 16
+
+# Fields of the optimized match JSON that the analyzer actually reads. Everything else
+# (notably the per-player FotMob 'stats' blobs) is dropped while streaming.
+MATCH_FIELDS = (
+    'match_id', 'date', 'league', 'season', 'round', 'home_team', 'away_team',
+    'home_team_id', 'away_team_id', 'home_score', 'away_score',
+    'home_formation', 'away_formation', 'substitutions', 'stats'
+)
+MATCH_PLAYER_LISTS = ('home_lineup', 'away_lineup', 'home_subs', 'away_subs')
+PLAYER_FIELDS = (
+    'id', 'name', 'position_id', 'position', 'shirt_number', 'age',
+    'rating', 'minutes', 'goals', 'assists', 'xG'
+)
+
+
+def project_match(match):
+    """Keep only the match and player fields used by the analysis"""
+    projected = {key: match[key] for key in MATCH_FIELDS if key in match}
+    for key in MATCH_PLAYER_LISTS:
+        if key in match:
+            projected[key] = [
+                {field: player[field] for field in PLAYER_FIELDS if field in player}
+                for player in match[key]
+            ]
+    return projected
+
+
+def _match_key(match):
+    """Identity of a match when merging: its match_id, or its fixture if it has none"""
+    match_id = match.get('match_id')
+    if match_id is not None:
+        return match_id
+    return (match.get('date'), match.get('home_team'), match.get('away_team'))
+
+
+# Versioned local snapshot: fixed header (magic, format version, payload length,
+# SHA-256 of payload) followed by a pickled payload of projected matches.
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'optimized_football_data.snapshot')
+# Plain pickle of the optimized JSON committed with the repo: the cold-start fallback when
+# the source cannot be reached and there is no local snapshot yet
+BUNDLED_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pkl1.pkl')
+SNAPSHOT_MAGIC = b'CMPOSNAP'
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('>8sHQ32s')
+
+
+def write_snapshot(path, matches, team_names, source=None, etag=None):
+    """Write matches to a versioned snapshot file atomically"""
+    payload = pickle.dumps({
+        'matches': matches,
+        'team_names': team_names,
+        'source': source,
+        'etag': etag,
+        'created_at': datetime.now().isoformat()
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, len(payload), hashlib.sha256(payload).digest())
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path):
+    """
+    Read a snapshot written by write_snapshot, verifying magic, version, length and checksum.
+    Legacy plain pickles of the optimized JSON ({'matches': [...], ...}, e.g. pkl1.pkl) are
+    also accepted as format version 0, without checksum. Only load snapshots you created.
+    Raises ValueError when the file is not a valid snapshot.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(SNAPSHOT_HEADER.size)
+        if not header.startswith(SNAPSHOT_MAGIC):
+            f.seek(0)
+            raw_data = pickle.load(f)
+            if not (isinstance(raw_data, dict) and isinstance(raw_data.get('matches'), list)):
+                raise ValueError("not a snapshot (bad magic) and not a legacy {'matches': [...]} pickle")
+            teams = raw_data.get('teams') or {}
+            return {
+                'format_version': 0,
+                'matches': [project_match(match) for match in raw_data['matches']],
+                'team_names': sorted(team_info['name'] for team_info in teams.values()),
+                'source': None,
+                'etag': None
+            }
+        if len(header) < SNAPSHOT_HEADER.size:
+            raise ValueError("truncated snapshot header")
+        _, version, length, digest = SNAPSHOT_HEADER.unpack(header)
+        if version != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"unsupported snapshot version {version} (expected {SNAPSHOT_FORMAT_VERSION})")
+        payload = f.read(length + 1)
+    if len(payload) != length:
+        raise ValueError("snapshot payload length mismatch")
+    if hashlib.sha256(payload).digest() != digest:
+        raise ValueError("snapshot checksum mismatch")
+    snapshot = pickle.loads(payload)
+    snapshot['format_version'] = version
+    return snapshot
+
+
+def source_changed(json_url, etag):
+    """
+    Whether the JSON source may differ from data with this ETag, checked without
+    downloading the body. Without an ETag (or for a local path) it may; when the source
+    cannot be reached, the data is kept.
+    """
+    if not etag or not json_url.startswith(('http://', 'https://')):
+        return True
+    try:
+        response = requests.head(json_url, timeout=10, headers={'If-None-Match': etag})
+    except requests.exceptions.RequestException:
+        return False
+    if response.status_code == 304:
+        return False
+    return response.status_code == 200 and response.headers.get('ETag') != etag
+
+
+class JsonArrayStream:
+    """
+    Incremental JSON reader over an iterable of text chunks.
+
+    Iterating yields (array_key, element) for every element of a top-level list or of
+    the top-level object's `array_key` array, and (key, value) for every other
+    top-level member. Elements are decoded one at a time, so memory is bounded by the
+    largest single element instead of the whole document.
+    """
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, text_chunks, array_key='matches'):
+        self._chunks = iter(text_chunks)
+        self._buffer = ''
+        self._pos = 0
+        self._exhausted = False
+        self.array_key = array_key
+        self.root_type = None
+        self.array_found = False
+
+    def __iter__(self):
+        yield from self._iter_root()
+        # like json.loads, only whitespace may follow the root value
+        if self._next_char() != '':
+            self._fail("Extra data")
+
+    def _iter_root(self):
+        char = self._next_char()
+        if char == '[':
+            self.root_type = 'list'
+            self.array_found = True
+            for item in self._iter_array():
+                yield self.array_key, item
+        elif char == '{':
+            self.root_type = 'dict'
+            if self._peek() == '}':
+                self._pos += 1
+                return
+            while True:
+                key = self._decode_value()
+                self._expect(':')
+                if key == self.array_key and self._peek() == '[':
+                    self._pos += 1
+                    self.array_found = True
+                    for item in self._iter_array():
+                        yield self.array_key, item
+                else:
+                    yield key, self._decode_value()
+                char = self._next_char()
+                if char == '}':
+                    break
+                if char != ',':
+                    self._fail("Expecting ',' or '}'")
+        else:
+            self._fail("Expecting '{' or '['")
+
+    def _iter_array(self):
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self._decode_value()
+            char = self._next_char()
+            if char == ']':
+                return
+            if char != ',':
+                self._fail("Expecting ',' or ']'")
+
+    def _fill(self, min_length):
+        """Read chunks until the unread buffer holds at least min_length characters"""
+        if self._pos:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        parts = [self._buffer]
+        length = len(self._buffer)
+        while length < min_length and not self._exhausted:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._exhausted = True
+            else:
+                parts.append(chunk)
+                length += len(chunk)
+        self._buffer = ''.join(parts)
+
+    def _peek(self):
+        """Return the next non-whitespace character without consuming it ('' at end of input)"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in ' \t\n\r':
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if self._exhausted:
+                return ''
+            self._fill(JSON_STREAM_CHUNK_SIZE)
+
+    def _next_char(self):
+        char = self._peek()
+        self._pos += 1
+        return char
+
+    def _expect(self, expected):
+        if self._next_char() != expected:
+            self._fail(f"Expecting '{expected}'")
+
+    def _decode_value(self):
+        """Decode one value, reading more input (geometrically) until it is complete"""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A value ending exactly at the buffer edge may be a truncated number
+                if end < len(self._buffer) or self._exhausted:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._exhausted:
+                    raise
+            self._fill(2 * (len(self._buffer) - self._pos) + JSON_STREAM_CHUNK_SIZE)
+
+    def _fail(self, message):
+        raise json.JSONDecodeError(message, self._buffer, max(self._pos - 1, 0))
+
+
+# Columnar layout built by EnhancedTeamTacticalPredictor._build_columnar_tables
+FORMATION_STAT_KEYS = [
+    'ball_possession', 'total_shots', 'shots_on_target', 'big_chances',
+    'accurate_passes', 'fouls_committed', 'corners', 'expected_goals_xg'
+]
+# Team stats of the team-side records (stat arrays in this order; missing stats are 0.0).
+# The match JSON holds them as 'home_<key>'/'away_<key>' in its 'stats' dict.
+TEAM_STAT_KEYS = FORMATION_STAT_KEYS[:4] + ['big_chances_missed'] + FORMATION_STAT_KEYS[4:]
+TEAM_STAT_INDEX = {key: column for column, key in enumerate(TEAM_STAT_KEYS)}
+FORMATION_STAT_COLUMNS = [TEAM_STAT_INDEX[key] for key in FORMATION_STAT_KEYS]
+# Raw stat strings: a count or percentage with an optional share, e.g. "55%", "245 (82%)", "3/7 (43%)"
+STAT_STRING_PATTERN = (
+    r'^\s*(?P<value>[-+]?\d+(?:\.\d+)?)\s*(?P<percent>%)?\s*(?:/\s*\d+(?:\.\d+)?\s*)?'
+    r'(?:\(\s*(?P<ratio>[-+]?\d+(?:\.\d+)?)\s*%\s*\))?\s*$'
+)
+
+
+def parse_stat_values(values):
+    """
+    Parse raw match stat values in bulk into (values, ratios, unparseable) arrays.
+    Numbers pass through; strings give their leading count or percentage as the value
+    and their percentage as the ratio ("245 (82%)" -> 245, 82; "55%" -> 55, 55).
+    None, NaN and blank strings are missing (NaN, ratio NaN); anything else is NaN
+    and flagged unparseable.
+
+    All-numeric input is a single array conversion. Otherwise only the distinct values
+    are parsed (stat strings repeat a lot) and mapped back through their codes.
+    """
+    raw = pd.Series(values, dtype=object)
+    ratios = np.full(len(raw), np.nan)
+    try:
+        return np.array(raw.to_numpy(dtype=float, na_value=np.nan)), ratios, np.zeros(len(raw), dtype=bool)
+    except (TypeError, ValueError):
+        pass
+
+    try:
+        codes, uniques = pd.factorize(raw)
+    except TypeError:
+        # unhashable values (lists, dicts) are never parseable; factorize them by their text
+        codes, uniques = pd.factorize(raw.map(lambda value: value if isinstance(value, Hashable) else repr(value)))
+    uniques = pd.Series(uniques, dtype=object)
+    unique_values = np.array(pd.to_numeric(uniques, errors='coerce'), dtype=float)
+    unique_ratios = np.full(len(uniques), np.nan)
+    unique_unparseable = np.zeros(len(uniques), dtype=bool)
+    # Strings (or other objects) that are not plain numbers
+    text_mask = np.isnan(unique_values) & uniques.notna().to_numpy()
+    if text_mask.any():
+        text = uniques[text_mask].astype('str')
+        parts = text.str.extract(STAT_STRING_PATTERN)
+        value = parts['value'].astype(float)
+        unique_values[text_mask] = value.to_numpy()
+        unique_ratios[text_mask] = parts['ratio'].astype(float).where(parts['percent'].isna(), value).to_numpy()
+        unique_unparseable[text_mask] = (value.isna() & (text.str.strip() != '')).to_numpy()
+
+    # code -1 (None/NaN) -> the appended missing entry
+    codes = np.where(codes < 0, len(uniques), codes)
+    result = np.append(unique_values, np.nan)[codes]
+    ratios = np.append(unique_ratios, np.nan)[codes]
+    unparseable = np.append(unique_unparseable, False)[codes]
+    return result, ratios, unparseable
+
+
+TEAM_MATCH_COLUMNS = ['team', 'match_pos', 'date', 'formation', 'team_score', 'opponent_score', 'result', 'is_home']
+APPEARANCE_COLUMNS = [
+    'team_match_row', 'team', 'player_id', 'name', 'is_starter', 'subbed_in',
+    'formation', 'position', 'goals', 'assists', 'xG', 'minutes', 'rating'
+]
+SUBSTITUTION_COLUMNS = [
+    'team_match_row', 'team', 'player_id', 'minute', 'result', 'goals', 'assists', 'xG', 'rating'
+]
+
+
+# Venue filters of windowed profiles (analyze_team_tactical_profile(venue=...))
+WINDOW_VENUES = ('home', 'away')
+# Starts / rated appearances behind recent_starts, recent_frequency and recent_form_avg
+RECENT_MATCHES = 5
+
+
+# Two-sided 95% t critical values for 1-30 degrees of freedom; larger samples use the normal 1.96
+T_CRITICAL_95 = (
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042
+)
+
+
+def _formation_columns(played):
+    """
+    Additive per-match columns of the formation analyses, for team-match rows with a
+    formation: usage, W/D/L, goals and each team stat's sum, count and sum of squares.
+    Summed per formation (group-by or prefix sums) they give every formation figure.
+    """
+    columns = {
+        'usage_count': np.ones(len(played), dtype=np.int64),
+        'W': (played['result'] == 'W').to_numpy(),
+        'D': (played['result'] == 'D').to_numpy(),
+        'L': (played['result'] == 'L').to_numpy(),
+        'goals_for': played['team_score'].to_numpy(),
+        'goals_against': played['opponent_score'].to_numpy(),
+    }
+    for key in FORMATION_STAT_KEYS:
+        stat = played[key].to_numpy(dtype=float)
+        present = ~np.isnan(stat)
+        columns[key] = np.where(present, stat, 0.0)
+        columns[f'{key}_count'] = present
+        columns[f'{key}_sumsq'] = columns[key] ** 2
+    return columns
+
+
+def _cumulative(codes, match, values, groups, length):
+    """Per group, cumulative sums of values over match indexes 0..length-1, shape (groups, length + 1)"""
+    values = np.asarray(values)
+    totals = np.zeros((groups, length + 1), dtype=np.int64 if values.dtype.kind in 'biu' else np.float64)
+    np.add.at(totals, (codes, match + 1), values)
+    return totals.cumsum(axis=1)
+
+
+def _split_by_group(codes, groups, *arrays):
+    """Per group, the elements of each array (kept in order), as lists of arrays"""
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(groups + 1))
+    return [[array[order[bounds[g]:bounds[g + 1]]] for g in range(groups)] for array in arrays]
+
+
+class _GroupTotals:
+    """
+    Per-group totals of additive per-row columns over any window [start, stop) of match
+    indexes. Integer (and boolean) columns are kept as cumulative sums, so a window total
+    is the exact difference of two prefixes. Float columns keep each group's values in
+    match order and are summed over the window directly: a difference of float prefixes
+    is off in the last bits, which can flip a rounded average.
+    """
+
+    def __init__(self, codes, match, columns, groups, length):
+        self.names = list(columns)
+        self.cumulative = {}
+        self.values = {}
+        for name, values in columns.items():
+            values = np.asarray(values)
+            if values.dtype.kind in 'biu':
+                self.cumulative[name] = _cumulative(codes, match, values, groups, length)
+            else:
+                self.values[name] = _split_by_group(codes, groups, match, values)
+
+    def __getitem__(self, name):
+        """Cumulative sums of an integer column, shape (groups, length + 1)"""
+        return self.cumulative[name]
+
+    def window(self, group, start, stop):
+        """{column: total} of one group over the window (floats as Python floats)"""
+        totals = {}
+        for name in self.names:
+            if name in self.cumulative:
+                cumulative = self.cumulative[name]
+                totals[name] = cumulative[group, stop] - cumulative[group, start]
+            else:
+                matches, values = self.values[name]
+                low, high = _in_window(matches[group], start, stop)
+                totals[name] = math.fsum(values[group][low:high])
+        return totals
+
+
+class _WindowSequence:
+    """Prefix aggregates over one date-sorted run of a team's matches (all, home or away)"""
+
+    def __init__(self, team_matches, appearances, substitutions):
+        length = len(team_matches)
+        self.length = length
+        self.match_orders = team_matches['match_order'].to_numpy()
+        self.dates = team_matches['date'].to_numpy(dtype=object)
+        local = pd.Series(np.arange(length), index=team_matches.index)
+
+        # Formations (rows with a formation): usage, results, goals and team stats
+        played = team_matches[team_matches['formation'] != '']
+        codes, self.formations = pd.factorize(played['formation'])
+        match = local[played.index].to_numpy()
+        groups = len(self.formations)
+        self.formation_totals = _GroupTotals(codes, match, _formation_columns(played), groups, length)
+        self.formation_matches, = _split_by_group(codes, groups, match)
+
+        # Player appearances
+        appearances = appearances[appearances['team_match_row'].isin(team_matches.index)]
+        codes, self.player_ids = pd.factorize(appearances['player_id'])
+        match = local[appearances['team_match_row']].to_numpy()
+        rank = np.arange(len(appearances))
+        groups = len(self.player_ids)
+        starter = appearances['is_starter'].to_numpy()
+        subbed_in = appearances['subbed_in'].to_numpy()
+        counted = starter | subbed_in
+        rating = appearances['rating'].to_numpy(dtype=float)
+        rated = counted & (rating > 0)
+        columns = {
+            'rows': np.ones(len(appearances), dtype=np.int64),
+            'starts': starter,
+            'sub_appearances': subbed_in,
+            'goals': appearances['goals'].to_numpy() * counted,
+            'assists': appearances['assists'].to_numpy() * counted,
+            'xG': appearances['xG'].to_numpy(dtype=float) * counted,
+            'minutes': appearances['minutes'].to_numpy() * counted,
+            'total_rating': np.where(rated, rating, 0.0),
+            'rating_count': rated,
+        }
+        self.player_totals = _GroupTotals(codes, match, columns, groups, length)
+        self.player_rows = _split_by_group(codes, groups, match, rank)
+        named = appearances['name'].notna().to_numpy()
+        self.player_names = _split_by_group(codes[named], groups, match[named], appearances['name'].to_numpy(dtype=object)[named])
+        self.player_rated = _split_by_group(codes[rated], groups, match[rated], rating[rated])
+        # Starts per (player, formation/position value): sorted match indexes, for most-frequent lookups
+        self.player_starts = _split_by_group(codes[starter], groups, match[starter])[0]
+        self.player_start_values = {}
+        for column in ('formation', 'position'):
+            value_codes, values = pd.factorize(appearances[column].to_numpy(dtype=object)[starter], use_na_sentinel=False)
+            # a missing value (None, or NaN in a string column) is one value, handed back as None like _most_frequent
+            values = [None if pd.isna(value) else value for value in values]
+            per_player = _split_by_group(codes[starter], groups, match[starter], value_codes)
+            self.player_start_values[column] = [
+                {values[code]: player_match[player_codes == code] for code in pd.unique(player_codes)}
+                for player_match, player_codes in zip(*per_player)
+            ]
+
+        # Substitution events
+        substitutions = substitutions[substitutions['team_match_row'].isin(team_matches.index)]
+        codes, self.sub_player_ids = pd.factorize(substitutions['player_id'])
+        match = local[substitutions['team_match_row']].to_numpy()
+        groups = len(self.sub_player_ids)
+        rating = substitutions['rating'].to_numpy(dtype=float)
+        minute = substitutions['minute'].to_numpy(dtype=float)
+        columns = {
+            'total_sub_apps': np.ones(len(substitutions), dtype=np.int64),
+            'goals_as_sub': substitutions['goals'].to_numpy(),
+            'assists_as_sub': substitutions['assists'].to_numpy(),
+            'xG_as_sub': substitutions['xG'].to_numpy(dtype=float),
+            'total_rating_as_sub': np.where(rating > 0, rating, 0.0),
+            'rating_count_as_sub': rating > 0,
+            'W': (substitutions['result'] == 'W').to_numpy(),
+            'D': (substitutions['result'] == 'D').to_numpy(),
+            'L': (substitutions['result'] == 'L').to_numpy(),
+        }
+        self.sub_totals = _GroupTotals(codes, match, columns, groups, length)
+        self.sub_rows = _split_by_group(codes, groups, match, np.arange(len(substitutions)))
+        timed = ~np.isnan(minute)
+        self.sub_minutes = _split_by_group(codes[timed], groups, match[timed], minute[timed])
+
+    def window(self, last_n=None, date_from=None, date_to=None):
+        """Match index range [start, stop) of this run for a date range and/or the last N matches"""
+        start, stop = 0, self.length
+        if date_from is not None:
+            start = int(np.searchsorted(self.dates, _date_key(date_from), side='left'))
+        if date_to is not None:
+            # inclusive: any time on date_to
+            stop = int(np.searchsorted(self.dates, _date_key(date_to) + '\uffff', side='right'))
+        if last_n is not None:
+            start = max(start, stop - last_n)
+        return start, max(start, stop)
+
+
+def _date_key(value):
+    """Sortable text for a date bound: ISO format, like the match dates"""
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def _in_window(match, start, stop):
+    """Slice bounds of the elements of a sorted match index array within [start, stop)"""
+    return np.searchsorted(match, start, side='left'), np.searchsorted(match, stop, side='left')
+
+
+class TeamWindowIndex:
+    """
+    Cumulative (prefix-sum) aggregates over one team's date-sorted matches, for profiles
+    of a window of them: the last N matches and/or a date range, optionally home or
+    away only (each venue has its own run of matches).
+
+    Every count and sum behind a profile (formation usage, results, goals and team
+    stats; player appearances, starts, goals, minutes and ratings; substitution stats)
+    is kept per match: counts as cumulative arrays, so the total over a window [i, j) is
+    cum[j] - cum[i] whatever its length, and float sums (xG, ratings, stat values) as
+    per-group values in match order, summed over the window slice. Order-dependent
+    fields (recent starts and form, most frequent formation/position, first-seen order,
+    last name) are looked up with searchsorted in per-player sorted match indexes.
+    """
+
+    def __init__(self, team_matches, appearances, substitutions):
+        self.sequences = {None: _WindowSequence(team_matches, appearances, substitutions)}
+        for venue in WINDOW_VENUES:
+            venue_matches = team_matches[team_matches['is_home'] == (venue == 'home')]
+            self.sequences[venue] = _WindowSequence(venue_matches, appearances, substitutions)
+
+    def window(self, last_n=None, date_from=None, date_to=None, venue=None):
+        """(run of matches, start, stop) for the window"""
+        if venue not in self.sequences:
+            raise ValueError(f"venue must be one of {WINDOW_VENUES} or None, got {venue!r}")
+        if last_n is not None and last_n < 0:
+            raise ValueError(f"last_n must not be negative, got {last_n}")
+        sequence = self.sequences[venue]
+        return (sequence,) + sequence.window(last_n, date_from, date_to)
+
+
+class EnhancedTeamTacticalPredictor:
+    def __init__(self, reporter=None):
+        self.reporter = reporter or ConsoleReporter()
+        self.data = None
+        self.team_analysis = {}
+        self.team_names = []
+        self.team_match_index = {}
+        self.team_match_table = None
+        self.appearance_table = None
+        self.substitution_table = None
+        self.player_directory = {}
+        self.data_version = 0
+        self.profile_cache = OrderedDict()
+        self.profile_cache_size = 64
+        self._profile_cache_lock = threading.Lock()
+        # team -> (data_version, TeamWindowIndex)
+        self._window_indexes = {}
+        # Per match position, {team: team-side record} and its stat array (see _split_team_sides)
+        self._team_sides = []
+        self._team_stat_values = []
+        # Match stat values that could not be parsed: [{'match_id', 'stat', 'value'}]
+        self.stat_issues = []
+        self.source_etag = None
+        # JSON source the matches belong to (None for the bundled or another source-less
+        # snapshot), and the file or URL they were actually read from
+        self.source = None
+        self.loaded_from = None
+        self.position_map = {
+            1: 'GK', 11: 'GK',
+            30: 'SW', 31: 'SW', 32: 'RB', 33: 'RCB', 34: 'RCB', 35: 'CB', 36: 'LCB', 37: 'LCB',
+            38: 'LB', 39: 'RWB', 40: 'LWB', 41: 'WB', 42: 'RWB', 48: 'LWB',
+            60: 'DM', 61: 'DM', 63: 'CDM', 64: 'RDM', 65: 'DM', 66: 'LDM', 89: 'LDM', 90: 'RDM',
+            55: 'ZM', 67: 'CM', 68: 'RCM', 69: 'LCM', 72: 'RZM', 73: 'RCM', 74: 'CM', 75: 'CM', 76: 'CM', 77: 'LCM',
+            53: 'RM', 57: 'LOV', 71: 'ROV', 78: 'LM', 79: 'LV', 83: 'RM', 87: 'LM', 88: 'LM',
+            82: 'AM', 84: 'AM', 85: 'CAM', 86: 'AM', 91: 'AM',
+            92: 'SS', 93: 'CF', 100: 'FW', 101: 'ST', 102: 'ST', 103: 'RW', 104: 'RS', 105: 'ST',
+            106: 'LS', 107: 'LW', 115: 'ST'
+        }
+
+    def load_optimized_data(self, json_url, snapshot_path=SNAPSHOT_PATH, use_snapshot=True,
+                            fallback_snapshot_path=BUNDLED_SNAPSHOT_PATH, revalidate_snapshot=False):
+        """
+        Load pre-processed optimized data. A local snapshot for the same source is tried
+        first; otherwise the JSON (URL or local path) is streamed one match at a time and
+        a fresh snapshot is written for the next cold start. If that fails too, a cold
+        start (use_snapshot) falls back to the snapshot bundled with the repo.
+
+        revalidate_snapshot only trusts the local snapshot when the source confirms its
+        ETag (or cannot be reached); an out-of-date snapshot is still preferred to the
+        bundled one if the source fails to load.
+        """
+        stale_snapshot = False
+        if use_snapshot and snapshot_path and os.path.exists(snapshot_path):
+            if self.load_snapshot(snapshot_path, expected_source=json_url):
+                if not revalidate_snapshot or not source_changed(json_url, self.source_etag):
+                    return True
+                self.reporter.write("↩️ The snapshot is out of date; loading the JSON source.")
+                stale_snapshot = True
+            else:
+                self.reporter.write("↩️ Falling back to the JSON source.")
+
+        if self._load_json_source(json_url, snapshot_path):
+            self.source = self.loaded_from = json_url
+            return True
+        if stale_snapshot:
+            self.reporter.write(f"↩️ Keeping the out-of-date snapshot {snapshot_path}.")
+            return self.load_snapshot(snapshot_path, expected_source=json_url)
+        if use_snapshot and fallback_snapshot_path and os.path.exists(fallback_snapshot_path):
+            self.reporter.write(f"↩️ Falling back to the bundled snapshot {fallback_snapshot_path}.")
+            return self.load_snapshot(fallback_snapshot_path)
+        return False
+
+    def _load_json_source(self, json_url, snapshot_path):
+        """Stream the JSON source (URL or local path), writing a snapshot after a download; False on failure"""
+        try:
+            self.reporter.write(f"🔍 Trying to load data from: {json_url}")
+
+            if not json_url.startswith(('http://', 'https://')):
+                with open(json_url, encoding='utf-8') as f:
+                    self.reporter.write(f"✅ File found, size: {os.path.getsize(json_url)} bytes")
+                    return self._ingest_json_stream(iter(lambda: f.read(JSON_STREAM_CHUNK_SIZE), ''), json_url)
+
+            headers = {
+                'Accept': 'application/json',
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+            }
+
+            with requests.get(json_url, timeout=60, headers=headers, stream=True) as response:
+                if response.status_code == 200:
+                    self.reporter.write(f"✅ File found, size: {response.headers.get('Content-Length', 'unknown')} bytes")
+                    self.source_etag = response.headers.get('ETag')
+                    chunks = codecs.iterdecode(response.iter_content(chunk_size=JSON_STREAM_CHUNK_SIZE), 'utf-8')
+                    loaded = self._ingest_json_stream(chunks, json_url)
+                    if loaded and snapshot_path:
+                        self.save_snapshot(snapshot_path, source=json_url)
+                    return loaded
+                else:
+                    self.reporter.error(f"❌ JSON file not found or accessible (status: {response.status_code})")
+                    return False
+
+        except requests.exceptions.Timeout:
+            self.reporter.error(f"❌ Request to {json_url} timed out.")
+            return False
+        except json.JSONDecodeError as jde:
+            self.reporter.error(f"❌ JSON decoding error from {json_url}: {str(jde)}")
+            self.reporter.write("Please ensure the JSON file is valid.")
+            return False
+        except Exception as e:
+            self.reporter.error(f"❌ Error loading data from {json_url}: {str(e)}")
+            return False
+
+    def load_snapshot(self, snapshot_path, expected_source=None):
+        """
+        Load matches from a local snapshot file; returns False if it is missing or corrupt,
+        or (with expected_source) was not built from that source
+        """
+        try:
+            snapshot = read_snapshot(snapshot_path)
+        except Exception as e:
+            self.reporter.write(f"⚠️ Ignoring snapshot {snapshot_path}: {str(e)}")
+            return False
+
+        if expected_source and snapshot.get('source') != expected_source:
+            self.reporter.write(f"⚠️ Ignoring snapshot {snapshot_path}: built from {snapshot.get('source') or 'no source'}")
+            return False
+
+        self._set_match_data(snapshot['matches'])
+        self.team_names = snapshot['team_names'] or sorted(self.team_match_index)
+        self.source_etag = snapshot.get('etag')
+        self.source = snapshot.get('source')
+        self.loaded_from = snapshot_path
+        self.reporter.write(f"⚡ Loaded {len(self.data)} matches and {len(self.team_names)} teams from snapshot {snapshot_path}")
+        return bool(self.team_names)
+
+    def save_snapshot(self, snapshot_path, source=None):
+        """Persist the loaded matches as a snapshot (best effort)"""
+        try:
+            write_snapshot(snapshot_path, self.data, self.team_names, source=source, etag=self.source_etag)
+            return True
+        except Exception as e:
+            self.reporter.write(f"⚠️ Could not write snapshot {snapshot_path}: {str(e)}")
+            return False
+
+    def _ingest_json_stream(self, text_chunks, json_url):
+        """Parse the 'matches' array element by element, keeping only the projected fields of each match"""
+        stream = JsonArrayStream(text_chunks, array_key='matches')
+        matches = []
+        teams = None
+        for key, value in stream:
+            if key == 'matches':
+                matches.append(project_match(value))
+            elif key == 'teams':
+                teams = value
+        self.reporter.write(f"✅ Successfully loaded JSON from {json_url}")
+
+        # The provided optimized_football_data.json has a 'matches' key at the top level
+        if stream.root_type == 'dict' and stream.array_found:
+            self._set_match_data(matches)
+            self.reporter.write(f"✅ Extracted {len(self.data)} matches from 'matches' key.")
+
+            # Also load team names from the 'teams' key if available in the optimized format
+            if teams:
+                self.team_names = sorted([team_info['name'] for team_info in teams.values()])
+                self.reporter.write(f"🏟️ Loaded {len(self.team_names)} team names from 'teams' key.")
+            else:
+                # Fallback to extracting team names from matches if 'teams' key is not present or empty
+                self.team_names = sorted(self.team_match_index)
+                self.reporter.write(f"🏟️ Extracted {len(self.team_names)} team names from matches.")
+        elif stream.root_type == 'list': # Fallback if the JSON is just a list of matches
+            self._set_match_data(matches)
+            self.reporter.write(f"✅ Loaded {len(self.data)} matches (JSON is a list).")
+            self.team_names = sorted(self.team_match_index)
+            self.reporter.write(f"🏟️ Extracted {len(self.team_names)} team names from matches.")
+        else:
+            self.reporter.error("❌ JSON data structure not recognized (expected 'matches' key or a list).")
+            return False
+
+        if self.team_names:
+            return True
+        else:
+            self.reporter.error("❌ No team names could be extracted from the data.")
+            return False
+
+    def _set_match_data(self, matches):
+        """Install a new match list, rebuilding the index and invalidating cached profiles"""
+        self.data = matches
+        values, ratios, self.stat_issues = self._parse_match_stats(matches or [])
+        self._report_stat_issues(self.stat_issues)
+        split = [self._split_team_sides(match, values[i], ratios[i]) for i, match in enumerate(matches or [])]
+        self._team_sides = [sides for sides, _ in split]
+        self._team_stat_values = [stat_values for _, stat_values in split]
+        self._build_team_match_index()
+        self._build_columnar_tables()
+        self.data_version += 1
+        with self._profile_cache_lock:
+            self.profile_cache.clear()
+            self._window_indexes.clear()
+
+    def append_matches(self, matches):
+        """
+        Merge new or corrected matches (e.g. a matchday) into the loaded data without a full
+        rebuild. Matches are projected like loaded ones and deduplicated by match_id (by
+        date, home_team and away_team for matches without one), the last copy winning: a
+        known match replaces it in place (identical copies are skipped), anything else is
+        appended.
+
+        Only the rows of these matches are rebuilt in the columnar tables, and only the
+        cached profiles of the teams they involve (before and after a correction) are
+        dropped, so every profile is identical to one computed after reloading the merged
+        match list. data_version is bumped if anything changed.
+        Returns {'added': n, 'updated': n, 'unchanged': n, 'teams': sorted affected teams}.
+        """
+        data = list(self.data or [])
+        team_sides = list(self._team_sides)
+        stat_values = list(self._team_stat_values)
+        positions = {_match_key(match): position for position, match in enumerate(data)}
+        changed = {}
+        unchanged = 0
+        added = []
+        added_keys = {}
+        for match in map(project_match, matches):
+            key = _match_key(match)
+            if key in positions:
+                if data[positions[key]] == match:
+                    unchanged += 1
+                    changed.pop(positions[key], None)
+                else:
+                    changed[positions[key]] = match
+            elif key in added_keys:
+                added[added_keys[key]] = match
+            else:
+                added_keys[key] = len(added)
+                added.append(match)
+
+        summary = {'added': len(added), 'updated': len(changed), 'unchanged': unchanged, 'teams': []}
+        if not changed and not added:
+            return summary
+
+        affected = set()
+        index = {team_name: list(team_positions) for team_name, team_positions in self.team_match_index.items()}
+        for position, match in changed.items():
+            for team_name in self._match_teams(data[position]):
+                affected.add(team_name)
+                index[team_name].remove(position)
+            data[position] = match
+        first_added = len(data)
+        data.extend(added)
+        rebuilt = sorted(changed) + list(range(first_added, len(data)))
+
+        rebuilt_matches = [data[position] for position in rebuilt]
+        values, ratios, issues = self._parse_match_stats(rebuilt_matches)
+        self._report_stat_issues(issues)
+        rebuilt_ids = {match.get('match_id') for match in rebuilt_matches}
+        team_sides.extend([None] * len(added))
+        stat_values.extend([None] * len(added))
+        for i, position in enumerate(rebuilt):
+            team_sides[position], stat_values[position] = self._split_team_sides(data[position], values[i], ratios[i])
+        for position in rebuilt:
+            for team_name in self._match_teams(data[position]):
+                affected.add(team_name)
+                bisect.insort(index.setdefault(team_name, []), position)
+
+        self.data = data
+        self._team_sides = team_sides
+        self._team_stat_values = stat_values
+        self.stat_issues = [issue for issue in self.stat_issues if issue['match_id'] not in rebuilt_ids] + issues
+        self.team_match_index = {team_name: team_positions for team_name, team_positions in index.items() if team_positions}
+        # teams renamed or left without matches by a correction drop out, as on a fresh load of the merged matches
+        self.team_names = sorted(self.team_match_index)
+        if self.team_match_table is None:
+            self._build_columnar_tables()
+        else:
+            self._update_columnar_tables(rebuilt, set(changed))
+
+        previous_version = self.data_version
+        self.data_version += 1
+        with self._profile_cache_lock:
+            # (team, version) or (team, version, window) -> same key at the new version
+            self.profile_cache = OrderedDict(
+                ((key[0], self.data_version) + key[2:], profile)
+                for key, profile in self.profile_cache.items()
+                if key[1] == previous_version and key[0] not in affected
+            )
+            self._window_indexes = {
+                team_name: (self.data_version, index)
+                for team_name, (version, index) in self._window_indexes.items()
+                if version == previous_version and team_name not in affected
+            }
+
+        summary['teams'] = sorted(affected)
+        return summary
+
+    def _update_columnar_tables(self, positions, replaced):
+        """
+        Rebuild the table rows of the matches at positions (replaced: those that had rows
+        before) and merge them in match order, as _build_columnar_tables would lay them out
+        """
+        team_matches = self.team_match_table
+        first_row = len(team_matches)
+        team_rows = []
+        appearance_rows = []
+        substitution_rows = []
+        for position in positions:
+            rows = self._match_rows(position, first_row + len(team_rows))
+            team_rows.extend(rows[0])
+            appearance_rows.extend(rows[1])
+            substitution_rows.extend(rows[2])
+            self._match_substitution_names[position] = rows[3]
+
+        kept = ~team_matches['match_pos'].isin(replaced).to_numpy()
+        new_team_matches = pd.DataFrame(team_rows, columns=TEAM_MATCH_COLUMNS + FORMATION_STAT_KEYS)
+        new_team_matches.index = pd.RangeIndex(first_row, first_row + len(team_rows))
+        merged = team_matches[kept]
+        if team_rows:
+            merged = pd.concat([merged, new_team_matches]) if len(merged) else new_team_matches
+            merged = merged.sort_values('match_pos', kind='stable')
+        # old/new team-match row -> row in the merged table
+        row_map = pd.Series(np.arange(len(merged)), index=merged.index)
+        dropped_rows = team_matches.index[~kept]
+
+        def merge_rows(table, new_rows, columns):
+            table = table[~table['team_match_row'].isin(dropped_rows)]
+            if new_rows:
+                new_table = pd.DataFrame(new_rows, columns=columns)
+                table = pd.concat([table, new_table], ignore_index=True) if len(table) else new_table
+            table = table.assign(team_match_row=row_map.reindex(table['team_match_row']).to_numpy())
+            return table.sort_values('team_match_row', kind='stable').reset_index(drop=True)
+
+        self._set_columnar_tables(
+            merged.reset_index(drop=True),
+            merge_rows(self.appearance_table, appearance_rows, APPEARANCE_COLUMNS),
+            merge_rows(self.substitution_table, substitution_rows, SUBSTITUTION_COLUMNS)
+        )
+
+    def _build_columnar_tables(self):
+        """
+        Flatten matches into columnar tables: one row per team-match, one row per
+        player appearance (starters and bench) and one row per substitution event
+        """
+        team_rows = []
+        appearance_rows = []
+        substitution_rows = []
+        self._match_substitution_names = {}
+        for position in range(len(self.data or [])):
+            rows = self._match_rows(position, len(team_rows))
+            team_rows.extend(rows[0])
+            appearance_rows.extend(rows[1])
+            substitution_rows.extend(rows[2])
+            self._match_substitution_names[position] = rows[3]
+
+        self._set_columnar_tables(
+            pd.DataFrame(team_rows, columns=TEAM_MATCH_COLUMNS + FORMATION_STAT_KEYS),
+            pd.DataFrame(appearance_rows, columns=APPEARANCE_COLUMNS),
+            pd.DataFrame(substitution_rows, columns=SUBSTITUTION_COLUMNS)
+        )
+
+    def _match_rows(self, position, first_row):
+        """
+        Columnar rows of one match, its team-match rows numbered from first_row.
+        Returns (team rows, appearance rows, substitution rows, [(player_id, name)] of its substitution events)
+        """
+        team_rows = []
+        appearance_rows = []
+        substitution_rows = []
+        substitution_names = []
+        stat_values = self._team_stat_values[position][:, FORMATION_STAT_COLUMNS].tolist()
+        for side, (team_name, info) in enumerate(self._team_sides[position].items()):
+            row = first_row + len(team_rows)
+            formation = info['formation']
+            team_rows.append(
+                [team_name, position, info['date'] or '', formation or '',
+                 info['team_score'], info['opponent_score'], info['result'], info['is_home']]
+                + stat_values[side]
+            )
+
+            subbed_in_ids = {event['player_id'] for event in info['substitutions']}
+            for player in info['starters']:
+                appearance_rows.append(self._appearance_row(row, team_name, formation, player, True, False))
+            for player in info['substitutes']:
+                appearance_rows.append(self._appearance_row(row, team_name, formation, player, False, player['id'] in subbed_in_ids))
+
+            bench = {player['id']: player for player in info['substitutes']}
+            for event in info['substitutions']:
+                if event.get('player_name'):
+                    substitution_names.append((event['player_id'], event['player_name']))
+                player = bench.get(event['player_id'])
+                if player:
+                    substitution_rows.append([
+                        row, team_name, event['player_id'], self._parse_sub_minute(event.get('minute', 'Unknown')),
+                        info['result'], player.get('goals', 0), player.get('assists', 0),
+                        player.get('xG', 0.0), player.get('rating', 0)
+                    ])
+        return team_rows, appearance_rows, substitution_rows, substitution_names
+
+    def _set_columnar_tables(self, team_matches, appearances, substitutions):
+        """Install the columnar tables with their per-team row indexes and the player directory"""
+        self.team_match_table = team_matches
+        self.appearance_table = appearances
+        self.substitution_table = substitutions
+        self._team_match_rows = self.team_match_table.groupby('team', sort=False).indices
+        self._team_appearance_rows = self.appearance_table.groupby('team', sort=False).indices
+        self._team_substitution_rows = self.substitution_table.groupby('team', sort=False).indices
+        substitution_names = {}
+        for position in sorted(self._match_substitution_names):
+            substitution_names.update(self._match_substitution_names[position])
+        self._build_player_directory(substitution_names)
+
+    def _build_player_directory(self, substitution_names):
+        """Global player ID -> name (last seen in a lineup or bench, substitution events as backup)"""
+        named = self.appearance_table[self.appearance_table['name'].notna() & (self.appearance_table['name'] != '')]
+        named = named.drop_duplicates('player_id', keep='last')
+        self.player_directory = dict(substitution_names)
+        self.player_directory.update(zip(named['player_id'].tolist(), named['name'].tolist()))
+
+    def _appearance_row(self, team_match_row, team_name, formation, player, is_starter, subbed_in):
+        return [
+            team_match_row, team_name, player['id'], player['name'], is_starter, subbed_in,
+            formation, player.get('position', ''), player.get('goals', 0), player.get('assists', 0),
+            player.get('xG', 0.0), player.get('minutes', 0), player.get('rating', 0)
+        ]
+
+    def _parse_sub_minute(self, minute):
+        """Parse substitution minutes like 67, "67'" or "90+2" to an int (NaN if unknown)"""
+        if minute == 'Unknown':
+            return np.nan
+        try:
+            return int(str(minute).replace("'", "").split("+")[0])
+        except (TypeError, ValueError):
+            return np.nan
+
+    def _build_team_match_index(self):
+        """Build the team name -> match positions index over self.data"""
+        index = defaultdict(list)
+        for position, match in enumerate(self.data or []):
+            for team_name in self._match_teams(match):
+                index[team_name].append(position)
+        self.team_match_index = dict(index)
+
+    def _match_teams(self, match):
+        """The (one or two) distinct team names of a match"""
+        home_team = match.get('home_team')
+        away_team = match.get('away_team')
+        return [team_name for team_name in (home_team, away_team if away_team != home_team else None) if team_name]
+
+    def _safe_get(self, obj, path, default=None):
+        """Safely get nested dictionary values"""
+        keys = path.split('.')
+        current = obj
+        for key in keys:
+            if isinstance(current, dict) and key in current:
+                current = current[key]
+            elif isinstance(current, list) and key.isdigit():
+                idx = int(key)
+                if 0 <= idx < len(current):
+                    current = current[idx]
+                else:
+                    return default
+            else:
+                return default
+        return current if current is not None else default
+
+    def _parse_numeric_string(self, value):
+        """Parse one numeric string value (0.0 if missing or unparseable); see parse_stat_values"""
+        parsed = parse_stat_values([value])[0][0]
+        return 0.0 if np.isnan(parsed) else float(parsed)
+
+    def analyze_team_tactical_profile(self, team_name, last_n=None, date_from=None, date_to=None, venue=None):
+        """
+        Create comprehensive tactical profile for a specific team (memoized per data version).
+
+        A window restricts it to some of the team's matches: the last_n matches and/or
+        those from date_from to date_to (inclusive, dates or ISO strings), optionally
+        'home' or 'away' only; last_n applies after the other filters. Windowed profiles
+        come from the team's TeamWindowIndex and get a 'window' entry. Returns None when
+        no match is left.
+        """
+        if not self.data:
+            return None
+
+        window = (last_n, date_from, date_to, venue)
+        cache_key = (team_name, self.data_version) + ((window,) if any(value is not None for value in window) else ())
+        with self._profile_cache_lock:
+            if cache_key in self.profile_cache:
+                self.profile_cache.move_to_end(cache_key)
+                return self.profile_cache[cache_key]
+
+        if len(cache_key) == 3:
+            team_data = self._compute_windowed_profile(team_name, *window)
+        else:
+            team_data = self._compute_team_tactical_profile(team_name)
+        if team_data:
+            with self._profile_cache_lock:
+                self.profile_cache[cache_key] = team_data
+                while len(self.profile_cache) > self.profile_cache_size:
+                    self.profile_cache.popitem(last=False)
+        return team_data
+
+    def analyze_all_teams(self):
+        """
+        Profile every team at once with league-wide group-bys over the columnar tables.
+        Returns the per-team profiles plus league comparison tables:
+        {'profiles': {team: team_data}, 'team_comparison': DataFrame,
+         'formation_comparison': DataFrame, 'player_comparison': DataFrame}
+        """
+        if not self.data:
+            return None
+
+        profiles = self.analyze_teams()
+        comparison = self._league_comparison_tables(profiles)
+        comparison['profiles'] = profiles
+        return comparison
+
+    def analyze_teams(self, team_names=None):
+        """Profiles for all teams (or the given ones) from a single batch pass over the tables"""
+        profiles = {}
+        for team_name in sorted(self.team_match_index if team_names is None else team_names):
+            team_data = self._new_team_profile(team_name)
+            team_data['matches'] = self._team_match_infos(team_name)
+            if team_data['matches']:
+                profiles[team_name] = team_data
+
+        self._analyze_profiles(profiles, *self._team_tables(None if team_names is None else list(profiles)))
+        return profiles
+
+    def _compute_team_tactical_profile(self, team_name):
+        """Build the tactical profile for a team from its indexed matches"""
+        team_data = self._new_team_profile(team_name)
+        team_data['matches'] = self._team_match_infos(team_name)
+
+        if not team_data['matches']:
+            return None
+
+        self._analyze_profiles({team_name: team_data}, *self._team_tables(team_name))
+        return team_data
+
+    def _team_window_index(self, team_name):
+        """TeamWindowIndex of a team, built on first use per data version"""
+        with self._profile_cache_lock:
+            index = self._window_indexes.get(team_name)
+        if index is None or index[0] != self.data_version:
+            index = (self.data_version, TeamWindowIndex(*self._team_tables(team_name)))
+            with self._profile_cache_lock:
+                self._window_indexes[team_name] = index
+        return index[1]
+
+    def _compute_windowed_profile(self, team_name, last_n=None, date_from=None, date_to=None, venue=None):
+        """The profile of _compute_team_tactical_profile over a window of the team's matches, from prefix differences"""
+        matches = self._team_match_infos(team_name)
+        if not matches:
+            return None
+        sequence, start, stop = self._team_window_index(team_name).window(last_n, date_from, date_to, venue)
+        if start == stop:
+            return None
+
+        team_data = self._new_team_profile(team_name)
+        team_data['matches'] = [matches[order] for order in sequence.match_orders[start:stop]]
+        team_data['window'] = {'last_n': last_n, 'date_from': date_from, 'date_to': date_to, 'venue': venue}
+        total_matches = stop - start
+
+        def first_seen(groups, rows):
+            """Groups ordered by their first row in the window"""
+            firsts = []
+            for group in groups:
+                match, rank = rows[0][group], rows[1][group]
+                firsts.append(rank[_in_window(match, start, stop)[0]])
+            return [group for _, group in sorted(zip(firsts, groups))]
+
+        # Formations
+        usage = sequence.formation_totals['usage_count']
+        active = np.flatnonzero(usage[:, stop] - usage[:, start] > 0)
+        firsts = [sequence.formation_matches[group][_in_window(sequence.formation_matches[group], start, stop)[0]] for group in active]
+        for _, group in sorted(zip(firsts, active)):
+            formation = sequence.formations[group]
+            team_data['formations'][formation], team_data['performance_by_formation'][formation] = self._formation_entries(
+                sequence.formation_totals.window(group, start, stop), total_matches
+            )
+
+        # Player pool
+        rows = sequence.player_totals['rows']
+        active = np.flatnonzero(rows[:, stop] - rows[:, start] > 0)
+        for group in first_seen(active, sequence.player_rows):
+            data = sequence.player_totals.window(group, start, stop)
+            name_match, names = sequence.player_names[0][group], sequence.player_names[1][group]
+            last_name = _in_window(name_match, start, stop)
+            data['name'] = names[last_name[1] - 1] if last_name[1] > last_name[0] else None
+            rated_match, ratings = sequence.player_rated[0][group], sequence.player_rated[1][group]
+            rated = _in_window(rated_match, start, stop)
+            recent_ratings = ratings[max(rated[0], rated[1] - RECENT_MATCHES):rated[1]]
+            data['recent_form_avg'] = float(np.mean(recent_ratings)) if len(recent_ratings) else 0.0
+            start_match = sequence.player_starts[group]
+            started = _in_window(start_match, start, stop)
+            recent_starts = (start_match[max(started[0], started[1] - RECENT_MATCHES):started[1]] - start).tolist()
+            primary = {}
+            for column, per_player in sequence.player_start_values.items():
+                best = None
+                for value, value_match in per_player[group].items():
+                    bounds = _in_window(value_match, start, stop)
+                    if bounds[1] > bounds[0]:
+                        candidate = (-(bounds[1] - bounds[0]), value_match[bounds[0]], value)
+                        best = candidate if best is None or candidate[:2] < best[:2] else best
+                # no start in the window: '' as in the whole-season profile
+                primary[column] = best[2] if best is not None else ''
+            team_data['player_pool'][sequence.player_ids[group]] = self._player_pool_entry(
+                data, total_matches, recent_starts, primary['formation'], primary['position']
+            )
+
+        # Substitution analysis
+        team_data['substitution_analysis'] = {}
+        count = sequence.sub_totals['total_sub_apps']
+        active = np.flatnonzero(count[:, stop] - count[:, start] > 0)
+        for group in first_seen(active, sequence.sub_rows):
+            sa = sequence.sub_totals.window(group, start, stop)
+            results = [(result, sa.pop(result)) for result in ('W', 'D', 'L')]
+            minute_match, minutes = sequence.sub_minutes[0][group], sequence.sub_minutes[1][group]
+            timed = _in_window(minute_match, start, stop)
+            player_id = sequence.sub_player_ids[group]
+            team_data['substitution_analysis'][player_id] = self._substitution_entry(
+                team_data, player_id, sa, results, [int(minute) for minute in minutes[timed[0]:timed[1]]]
+            )
+        return team_data
+
+    def _new_team_profile(self, team_name):
+        return {
+            'team_name': team_name,
+            'matches': [],
+            'formations': {},
+            'player_pool': {},
+            'performance_by_formation': {},
+            'substitution_data': []
+        }
+
+    def _team_match_infos(self, team_name):
+        """Extract only this team's matches via the team -> match index, sorted by date"""
+        matches = [self._team_sides[position][team_name] for position in self.team_match_index.get(team_name, [])]
+
+        # Sort matches by date
+        matches.sort(key=lambda x: x.get('date', ''))
+        return matches
+
+    def _analyze_profiles(self, profiles, team_matches, appearances, substitutions):
+        """Run the analyses for every team in profiles; the tables may hold one team or the whole league"""
+        # Analyze formation usage and performance
+        self._analyze_formations(profiles, team_matches)
+
+        # Analyze player pool and rotation patterns
+        self._analyze_player_rotations(profiles, appearances)
+
+        # Analyze substitution patterns
+        self._analyze_substitution_patterns(profiles, substitutions)
+
+    def _team_tables(self, team_names=None):
+        """
+        Slice the columnar tables for one team, a list of teams or (None) all teams, adding
+        each row's position in its team's date-sorted match list as 'match_order'
+        """
+        if team_names is None:
+            team_matches = self.team_match_table
+            appearances = self.appearance_table
+            substitutions = self.substitution_table
+        else:
+            if isinstance(team_names, str):
+                team_names = [team_names]
+
+            def rows(index):
+                return np.sort(np.concatenate([index.get(name, []) for name in team_names] + [[]])).astype(int)
+
+            team_matches = self.team_match_table.iloc[rows(self._team_match_rows)]
+            appearances = self.appearance_table.iloc[rows(self._team_appearance_rows)]
+            substitutions = self.substitution_table.iloc[rows(self._team_substitution_rows)]
+
+        team_matches = team_matches.sort_values('date', kind='stable')
+        team_matches = team_matches.assign(match_order=team_matches.groupby('team', sort=False).cumcount().to_numpy())
+        match_order = team_matches['match_order']
+
+        def ordered(table):
+            table = table.assign(match_order=table['team_match_row'].map(match_order).to_numpy())
+            return table.sort_values('match_order', kind='stable')
+
+        return team_matches, ordered(appearances), ordered(substitutions)
+
+    def _league_comparison_tables(self, profiles):
+        """League-wide team, formation and player comparison tables built from the profiles"""
+        by_team = self.team_match_table.groupby('team')
+        team_comparison = by_team.agg(
+            matches=('result', 'size'),
+            goals_for=('team_score', 'sum'),
+            goals_against=('opponent_score', 'sum'),
+            avg_possession=('ball_possession', 'mean'),
+            avg_shots=('total_shots', 'mean'),
+            avg_xG=('expected_goals_xg', 'mean')
+        )
+        results = by_team['result'].value_counts().unstack(fill_value=0).reindex(columns=['W', 'D', 'L'], fill_value=0)
+        team_comparison = team_comparison.join(results.rename(columns={'W': 'wins', 'D': 'draws', 'L': 'losses'}))
+        team_comparison['points_per_game'] = (team_comparison['wins'] * 3 + team_comparison['draws']) / team_comparison['matches']
+        team_comparison['goal_difference'] = team_comparison['goals_for'] - team_comparison['goals_against']
+
+        formation_rows = []
+        player_rows = []
+        for team_name, team_data in profiles.items():
+            for formation, data in team_data['formations'].items():
+                perf_data = team_data['performance_by_formation'].get(formation, {})
+                formation_rows.append({
+                    'team': team_name,
+                    'formation': formation,
+                    'usage_count': data['usage_count'],
+                    'usage_rate': data['usage_rate'],
+                    'win_rate': data['win_rate'],
+                    'points_per_game': data['points_per_game'],
+                    'goals_for_avg': data['goals_for_avg'],
+                    'goals_against_avg': data['goals_against_avg'],
+                    'avg_xG': perf_data.get('avg_xG', 0),
+                    'avg_possession': perf_data.get('avg_possession', 0),
+                    'avg_shots': perf_data.get('avg_shots', 0),
+                    'style_profile': perf_data.get('style_profile', '')
+                })
+            for player_id, player in team_data['player_pool'].items():
+                if player['total_appearances'] > 0: # Only include players who appeared
+                    player_rows.append({
+                        'team': team_name,
+                        'player_id': player_id,
+                        'name': player['name'],
+                        'role': player['role'],
+                        'primary_position': player['primary_position'],
+                        'starts': player['starts'],
+                        'sub_appearances': player['sub_appearances'],
+                        'start_rate': player['start_rate'],
+                        'goals': player['goals'],
+                        'assists': player['assists'],
+                        'xG': player['xG'],
+                        'avg_rating': player['avg_rating'],
+                        'total_minutes': player['total_minutes']
+                    })
+
+        formation_comparison = pd.DataFrame(formation_rows, columns=[
+            'team', 'formation', 'usage_count', 'usage_rate', 'win_rate', 'points_per_game',
+            'goals_for_avg', 'goals_against_avg', 'avg_xG', 'avg_possession', 'avg_shots', 'style_profile'
+        ])
+        player_comparison = pd.DataFrame(player_rows, columns=[
+            'team', 'player_id', 'name', 'role', 'primary_position', 'starts', 'sub_appearances',
+            'start_rate', 'goals', 'assists', 'xG', 'avg_rating', 'total_minutes'
+        ])
+
+        primary = formation_comparison.sort_values('usage_count', ascending=False, kind='stable').drop_duplicates('team')
+        team_comparison['primary_formation'] = primary.set_index('team')['formation'].reindex(team_comparison.index).fillna('')
+        team_comparison['squad_size'] = player_comparison.groupby('team').size().reindex(team_comparison.index, fill_value=0)
+        team_comparison['key_players'] = (
+            player_comparison[player_comparison['role'] == "🔵 Key Player"].groupby('team').size()
+            .reindex(team_comparison.index, fill_value=0)
+        )
+        team_comparison = team_comparison.sort_values(['points_per_game', 'goal_difference'], ascending=False).reset_index()
+
+        return {
+            'team_comparison': team_comparison,
+            'formation_comparison': formation_comparison,
+            'player_comparison': player_comparison
+        }
+
+    def _parse_match_stats(self, matches):
+        """
+        Parse the team stats of many matches in one parse_stat_values pass.
+        Returns (values, ratios) arrays of shape (matches, 2 [home, away], TEAM_STAT_KEYS),
+        absent stats being 0.0 (ratio NaN), and the unparseable values as
+        [{'match_id', 'stat', 'value'}] (left out as NaN).
+        """
+        all_stats = [match.get('stats') or {} for match in matches]
+        names = [f'{side}_{key}' for side in ('home', 'away') for key in TEAM_STAT_KEYS]
+        raw = [stats.get(name, 0.0) for name in names for stats in all_stats]
+        values, ratios, unparseable = parse_stat_values(raw)
+        shape = (2, len(TEAM_STAT_KEYS), len(matches))
+        issues = [
+            {'match_id': matches[index % len(matches)].get('match_id'), 'stat': names[index // len(matches)], 'value': raw[index]}
+            for index in np.flatnonzero(unparseable).tolist()
+        ]
+        return values.reshape(shape).transpose(2, 0, 1), ratios.reshape(shape).transpose(2, 0, 1), issues
+
+    def _report_stat_issues(self, issues):
+        if issues:
+            examples = ", ".join(f"{issue['stat']}={issue['value']!r}" for issue in issues[:3])
+            self.reporter.write(
+                f"⚠️ {len(issues)} match stat values could not be parsed and are left out of the averages ({examples})"
+            )
+
+    def _split_team_sides(self, match, stat_values=None, stat_ratios=None):
+        """
+        Split a match into one record per (distinct) team, done once at load time: match
+        details from the team's side, and its team stats as floats in TEAM_STAT_KEYS order
+        (from _parse_match_stats, parsed here if not given). A stat's share, e.g. the 82%
+        of "245 (82%)", goes in the 'stats' dict as '<key>_pct'.
+        Returns ({team_name: record}, stat array with one row per record).
+        """
+        if stat_values is None:
+            parsed = self._parse_match_stats([match])
+            stat_values, stat_ratios = parsed[0][0], parsed[1][0]
+
+        substitutions_data = match.get('substitutions', {})
+        sides = {}
+        rows = []
+        for side_index, (side, other) in enumerate((('home', 'away'), ('away', 'home'))):
+            team_name = match.get(f'{side}_team')
+            if not team_name or team_name in sides:
+                continue
+            team_score = match.get(f'{side}_score')
+            opponent_score = match.get(f'{other}_score')
+            sides[team_name] = {
+                'date': match.get('date'),
+                'match_id': match.get('match_id'),
+                'league': match.get('league'),
+                'round': match.get('round'),
+                'is_home': side == 'home',
+                'opponent': match.get(f'{other}_team'),
+                'formation': match.get(f'{side}_formation'),
+                'starters': match.get(f'{side}_lineup', []),
+                'substitutes': match.get(f'{side}_subs', []),
+                'substitutions': substitutions_data.get(side, []),
+                'team_score': team_score,
+                'opponent_score': opponent_score,
+                'result': 'W' if team_score > opponent_score else 'D' if team_score == opponent_score else 'L',
+                'stats': dict(zip(TEAM_STAT_KEYS, stat_values[side_index].tolist()))
+            }
+            sides[team_name]['stats'].update(
+                (f'{key}_pct', ratio) for key, ratio in zip(TEAM_STAT_KEYS, stat_ratios[side_index].tolist()) if ratio == ratio
+            )
+            rows.append(side_index)
+        return sides, stat_values[rows]
+
+    def _extract_substitution_events(self, match, lineup_key, player_stats_dummy): # player_stats_dummy is unused now
+        """
+        This method is no longer strictly necessary with the optimized JSON,
+        as 'substitutions' array directly provides sub-in events.
+        It's kept for compatibility if needed for other data structures, but streamlined.
+        """
+        # In optimized JSON, match.substitutions directly contains player_id, player_name, minute
+        # We can enrich it with position and stats if needed from lineup data
+        
+        # Example of how you might merge it if 'substitutions' only has minimal info:
+        # For now, we assume the 'substitutions' list in the optimized JSON is sufficient
+        return match.get('substitutions', {}).get(lineup_key, [])
+
+
+    def _extract_player_info(self, players, player_stats_dummy): # player_stats_dummy is not used in optimized format
+        """Extract detailed player information from optimized lineup structure"""
+        player_info = []
+        for player in players:
+            player_data = {
+                'id': player.get('id'),
+                'name': player.get('name'),
+                'position_id': player.get('position_id'),
+                'position': player.get('position'),
+                'shirt_number': player.get('shirt_number'),
+                'age': player.get('age'),
+                'stats': player.get('stats', {}), # Directly use stats
+                'rating': player.get('rating', 0),
+                'minutes': player.get('minutes', 0),
+                'goals': player.get('goals', 0),
+                'assists': player.get('assists', 0),
+                'xG': player.get('xG', 0.0)
+            }
+            player_info.append(player_data)
+        return player_info
+
+    def _extract_single_player_info(self, player, player_stats_dummy): # player_stats_dummy not used
+        """Extract single player information from optimized player dict"""
+        return {
+            'id': player.get('id'),
+            'name': player.get('name'),
+            'position_id': player.get('position_id'),
+            'position': player.get('position'),
+            'shirt_number': player.get('shirt_number'),
+            'age': player.get('age'),
+            'stats': player.get('stats', {}),
+            'rating': player.get('rating', 0),
+            'minutes': player.get('minutes', 0),
+            'goals': player.get('goals', 0),
+            'assists': player.get('assists', 0),
+            'xG': player.get('xG', 0.0)
+        }
+
+    # Removed _extract_team_match_stats as its functionality is integrated into _split_team_sides
+
+    def _analyze_formations(self, profiles, team_matches):
+        """
+        Analyze formation usage and performance in one pass: a single group-by sum of the
+        additive formation columns (see _formation_columns) per team and formation
+        """
+        played = team_matches[team_matches['formation'] != '']
+        if played.empty:
+            return
+
+        totals = pd.DataFrame(_formation_columns(played), index=played.index).groupby(
+            [played['team'], played['formation']], sort=False
+        ).sum()
+        for (team_name, formation), perf in zip(totals.index.tolist(), totals.to_dict('records')):
+            team_data = profiles[team_name]
+            team_data['formations'][formation], team_data['performance_by_formation'][formation] = self._formation_entries(
+                perf, len(team_data['matches'])
+            )
+
+    def _formation_entries(self, totals, total_matches):
+        """(formation entry, performance entry) of a formation from its _formation_columns totals"""
+        formation_data = self._formation_entry(totals, total_matches)
+        avg_stats = {
+            key: totals[key] / totals[f'{key}_count'] if totals[f'{key}_count'] > 0 else np.nan
+            for key in FORMATION_STAT_KEYS
+        }
+        spread = {key: self._stat_spread(totals[key], totals[f'{key}_count'], totals[f'{key}_sumsq']) for key in FORMATION_STAT_KEYS}
+        return formation_data, self._formation_performance_entry(totals['usage_count'], avg_stats, formation_data, spread)
+
+    def _stat_spread(self, total, count, sumsq):
+        """Sample standard deviation and 95% confidence interval of a mean from its sum, count and sum of squares (NaN below 2 values)"""
+        if count < 2:
+            return {'std': np.nan, 'ci95_low': np.nan, 'ci95_high': np.nan}
+        mean = total / count
+        variance = max((sumsq - total * mean) / (count - 1), 0.0)
+        std = float(np.sqrt(variance))
+        margin = (T_CRITICAL_95[count - 2] if count - 1 <= len(T_CRITICAL_95) else 1.96) * std / np.sqrt(count)
+        return {'std': std, 'ci95_low': float(mean - margin), 'ci95_high': float(mean + margin)}
+
+    def _formation_entry(self, perf, total_matches):
+        """Formation usage/results entry from its usage_count, W, D, L, goals_for and goals_against"""
+        count = perf['usage_count']
+        total = perf['W'] + perf['D'] + perf['L']
+        return {
+            'usage_count': count,
+            'usage_rate': (count / total_matches) * 100,
+            'wins': perf['W'],
+            'draws': perf['D'],
+            'losses': perf['L'],
+            'win_rate': (perf['W'] / total) * 100 if total > 0 else 0,
+            'points_per_game': (perf['W'] * 3 + perf['D']) / total if total > 0 else 0,
+            'goals_for_avg': perf['goals_for'] / total if total > 0 else 0,
+            'goals_against_avg': perf['goals_against'] / total if total > 0 else 0
+        }
+
+    def _analyze_player_rotations(self, profiles, appearances):
+        """Analyze enhanced player rotation patterns"""
+        if appearances.empty:
+            return
+
+        keys = ['team', 'player_id']
+        # Starts always count; bench players only count when they actually came on
+        counted = appearances[appearances['is_starter'] | appearances['subbed_in']]
+        starts = appearances[appearances['is_starter']]
+        rated = counted[counted['rating'] > 0]
+
+        by_player = appearances.groupby(keys, sort=False)
+        totals = pd.DataFrame({
+            'name': by_player['name'].last(),
+            'starts': by_player['is_starter'].sum(),
+            'sub_appearances': by_player['subbed_in'].sum()
+        })
+        totals = totals.join(counted.groupby(keys)[['goals', 'assists', 'xG', 'minutes']].sum())
+        totals = totals.join(rated.groupby(keys)['rating'].agg(total_rating='sum', rating_count='size'))
+        totals = totals.join(rated.groupby(keys).tail(RECENT_MATCHES).groupby(keys)['rating'].mean().rename('recent_form_avg'))
+        totals[['goals', 'assists', 'minutes', 'rating_count']] = totals[['goals', 'assists', 'minutes', 'rating_count']].fillna(0).astype(int)
+        totals[['xG', 'total_rating', 'recent_form_avg']] = totals[['xG', 'total_rating', 'recent_form_avg']].fillna(0.0)
+
+        # Most frequent formation/position per player; ties go to the first one seen
+        primary_formation = self._most_frequent(starts, 'formation')
+        primary_position = self._most_frequent(starts, 'position')
+        recent_starts = starts.groupby(keys, sort=False)['match_order'].agg(lambda orders: orders.tolist()[-RECENT_MATCHES:]).to_dict()
+
+        # Calculate comprehensive player metrics
+        for key, data in zip(totals.index.tolist(), totals.to_dict('records')):
+            team_name, player_id = key
+            team_data = profiles[team_name]
+            team_data['player_pool'][player_id] = self._player_pool_entry(
+                data, len(team_data['matches']), recent_starts.get(key, []),
+                primary_formation.get(key, ''), primary_position.get(key, '')
+            )
+
+    def _player_pool_entry(self, data, total_matches, recent_starts, primary_formation, primary_position):
+        """
+        Player pool entry from the player's totals (name, starts, sub_appearances, goals,
+        assists, xG, minutes, total_rating, rating_count, recent_form_avg)
+        """
+        total_apps = data['starts'] + data['sub_appearances']
+        start_rate = data['starts'] / total_matches if total_matches > 0 else 0
+
+        # Determine player role
+        if total_apps == 0: # Handle players who didn't appear at all but are in lineup data
+            role = "⚪ Non-playing"
+        elif start_rate > 0.8:
+            role = "🔵 Key Player"
+        elif start_rate > 0.5:
+            role = "🟡 Regular Starter"
+        elif start_rate > 0.2:
+            role = "🟠 Squad Rotation"
+        else:
+            role = "⚪ Fringe Player"
+
+        # Calculate recent form
+        recent_frequency = len(recent_starts) / min(RECENT_MATCHES, total_matches) if total_matches > 0 else 0
+
+        return {
+            'name': data['name'],
+            'total_appearances': total_apps,
+            'starts': data['starts'],
+            'sub_appearances': data['sub_appearances'],
+            'start_rate': start_rate * 100,
+            'role': role,
+            'primary_formation': primary_formation,
+            'primary_position': primary_position,
+            'recent_frequency': recent_frequency * 100,
+            'avg_rating': data['total_rating'] / data['rating_count'] if data['rating_count'] > 0 else 0,
+            'recent_form_avg': data['recent_form_avg'],
+            'recent_starts': recent_starts,
+            'goals': data['goals'],
+            'assists': data['assists'],
+            'xG': data['xG'],
+            'total_minutes': data['minutes'],
+            'minutes_per_game': data['minutes'] / total_apps if total_apps > 0 else 0,
+            # Substitution timing lives in substitution_analysis
+            'avg_sub_minute': 0,
+            'sub_minute_range': ''
+        }
+
+    def _most_frequent(self, appearances, column):
+        """Per (team, player), the most frequent value of a column (first seen wins ties)"""
+        if appearances.empty:
+            return {}
+        counts = appearances.groupby(['team', 'player_id', column], sort=False, dropna=False).size()
+        top = counts.groupby(level=['team', 'player_id'], sort=False).idxmax()
+        # groupby turns a missing value (None) into NaN; hand it back as None
+        return {(team_name, player_id): None if pd.isna(value) else value for team_name, player_id, value in top.tolist()}
+
+    def _analyze_substitution_patterns(self, profiles, substitutions):
+        """Analyze detailed substitution patterns"""
+        for team_data in profiles.values():
+            team_data['substitution_analysis'] = {}
+        if substitutions.empty:
+            return
+
+        keys = ['team', 'player_id']
+        by_player = substitutions.groupby(keys, sort=False)
+        rated = substitutions[substitutions['rating'] > 0].groupby(keys)['rating']
+        totals = pd.DataFrame({
+            'total_sub_apps': by_player.size(),
+            'goals_as_sub': by_player['goals'].sum(),
+            'assists_as_sub': by_player['assists'].sum(),
+            'xG_as_sub': by_player['xG'].sum()
+        }).join(rated.agg(total_rating_as_sub='sum', rating_count_as_sub='size'))
+        results = by_player['result'].value_counts().unstack(fill_value=0).reindex(columns=['W', 'D', 'L'], fill_value=0)
+        sub_minutes = substitutions.dropna(subset=['minute']).groupby(keys, sort=False)['minute'].agg(
+            lambda minutes: [int(minute) for minute in minutes]
+        ).to_dict()
+
+        for key, sa in zip(totals.index.tolist(), totals.to_dict('records')):
+            team_name, player_id = key
+            team_data = profiles[team_name]
+            team_data['substitution_analysis'][player_id] = self._substitution_entry(
+                team_data, player_id, sa, results.loc[key].items(), sub_minutes.get(key, [])
+            )
+
+    def _substitution_entry(self, team_data, player_id, sa, results, sub_minutes):
+        """
+        Substitution analysis entry from the player's totals as a sub (total_sub_apps,
+        goals_as_sub, assists_as_sub, xG_as_sub, total_rating_as_sub, rating_count_as_sub),
+        (result, count) pairs and minutes
+        """
+        sa['total_rating_as_sub'] = sa['total_rating_as_sub'] if sa['rating_count_as_sub'] > 0 else 0
+        sa['rating_count_as_sub'] = int(sa['rating_count_as_sub']) if sa['rating_count_as_sub'] > 0 else 0
+        sa['results_when_subbed'] = {result: int(count) for result, count in results}
+        sa['sub_minutes'] = sub_minutes
+
+        # Calculate averages
+        sa['avg_sub_minute'] = round(np.mean(sa['sub_minutes']), 1) if sa['sub_minutes'] else 0
+        sa['avg_rating_as_sub'] = round(sa['total_rating_as_sub'] / sa['rating_count_as_sub'], 2) if sa['rating_count_as_sub'] > 0 else 0
+
+        # Add player name to substitution_analysis for easy lookup
+        if player_id in team_data['player_pool']:
+            sa['name'] = team_data['player_pool'][player_id]['name']
+        else:
+            # Fallback to the load-time player directory instead of rescanning matches
+            sa['name'] = self.player_directory.get(player_id) or f"Player {player_id}"
+
+        return sa
+
+    def _formation_performance_entry(self, matches, avg_stats, formation_data, spread):
+        """
+        Per-formation averages of the team stats (FORMATION_STAT_KEYS), the resulting style
+        and each stat's spread ({key: {'std', 'ci95_low', 'ci95_high'}})
+        """
+        return {
+            'matches': matches,
+            'avg_xG': avg_stats.get('expected_goals_xg', 0), 
+            'avg_possession': avg_stats.get('ball_possession', 0),
+            'avg_shots': avg_stats.get('total_shots', 0),
+            'avg_shots_on_target': avg_stats.get('shots_on_target', 0),
+            'avg_big_chances': avg_stats.get('big_chances', 0),
+            'avg_accurate_passes': avg_stats.get('accurate_passes', 0),
+            'avg_fouls': avg_stats.get('fouls_committed', 0),
+            'avg_corners': avg_stats.get('corners', 0),
+            'style_profile': self._determine_formation_style(formation_data, avg_stats),
+            'stat_spread': spread
+        }
+
+    def _stat_text(self, perf_data, key, spec):
+        """A formation average for the report; '-' when the stat had no parseable value (NaN)"""
+        value = perf_data.get(key, 0)
+        return '-' if pd.isna(value) else format(value, spec)
+
+    def _determine_formation_style(self, formation_data, avg_stats):
+        """Determine playing style for formation (stats without parseable values count as 0)"""
+        avg_stats = {key: 0 if pd.isna(value) else value for key, value in avg_stats.items()}
+        possession = avg_stats.get('ball_possession', 0)
+        goals_avg = formation_data.get('goals_for_avg', 0)
+
+        if possession > 55:
+            if goals_avg > 1.5:
+                return "🎯 Possession Attack"
+            else:
+                return "🔄 Possession Control"
+        elif avg_stats.get('total_shots', 0) > 13:
+            return "🚀 Direct Attack"
+        elif formation_data.get('goals_against_avg', 0) < 1.0:
+            return "🛡️ Defensive Solid"
+        else:
+            return "⚖️ Balanced"
+
+    def create_team_player_table(self, team_data, availability=None):
+        """
+        Per-player table of a team profile, as offered in the CSV download.
+        With availability ({player_id: record}, see create_team_report) it gets an Availability column.
+        """
+        csv_data = []
+        for player_id, player in team_data['player_pool'].items():
+            if player['total_appearances'] > 0: # Only include players who appeared
+                row = {
+                    'Player': player['name'],
+                    'Position': player['primary_position'], 
+                    'Starts': player['starts'],
+                    'Sub Apps': player['sub_appearances'],
+                    'Start Rate %': round(player['start_rate'], 1),
+                    'Goals': player['goals'],
+                    'Assists': player['assists'],
+                    'Avg Rating': round(player['avg_rating'], 2),
+                    'Minutes/Game': round(player['minutes_per_game'], 0),
+                    'Role': player['role']
+                }
+                if availability is not None:
+                    record = availability.get(player_id)
+                    row['Availability'] = self._availability_note(record) if record else 'available'
+                csv_data.append(row)
+        return pd.DataFrame(csv_data)
+
+    def estimate_lineup(self, team_data, availability=None, size=11):
+        """
+        Likely starting lineup without the unavailable players: the best available goalkeeper,
+        then the most regular available outfield players (recent starts, start rate, minutes).
+        availability: {player_id: record} as in create_team_report. Returns player pool entries.
+        """
+        availability = availability or {}
+        candidates = [
+            player for player_id, player in team_data['player_pool'].items()
+            if player['total_appearances'] > 0 and not availability.get(player_id, {}).get('unavailable')
+        ]
+        candidates.sort(key=lambda x: (x['recent_frequency'], x['start_rate'], x['total_minutes']), reverse=True)
+        keepers = [player for player in candidates if player['primary_position'] == 'GK'][:1]
+        outfield = [player for player in candidates if player['primary_position'] != 'GK']
+        return keepers + outfield[:size - len(keepers)]
+
+    def _availability_note(self, record):
+        """Short status text for an availability record"""
+        if record['status'] == 'injuries':
+            note = f"🚑 {record['reason'] or 'injured'}"
+        elif record['status'] == 'suspensions':
+            note = f"🟥 {record['reason'] or 'suspended'}"
+            if record.get('matches_missed'):
+                matches = record['matches_missed']
+                note += f" ({matches} match{'es' if matches != 1 else ''})"
+        else:
+            note = "🟨 at risk of suspension"
+        if record.get('until'):
+            note += f", until {record['until']}"
+        return note
+
+    def create_team_report(self, team_name, team_data=None, availability=None):
+        """
+        Create comprehensive team tactical report (pass team_data to reuse a batch profile).
+
+        availability: optional {player_id: record} from the injuries/suspensions data
+        (player_data.PlayerAvailability.for_team), record = {'status', 'unavailable',
+        'reason', 'until', 'matches_missed'}. Listed players are marked and the report
+        gets an availability section with the expected lineup.
+        """
+        if team_data is None:
+            team_data = self.analyze_team_tactical_profile(team_name)
+
+        if not team_data:
+            return f"❌ No data found for {team_name}"
+
+        report = []
+        report.append(f"🏆 {team_name.upper()} - COMPREHENSIVE TACTICAL ANALYSIS")
+        report.append("=" * 80)
+        if team_data.get('window'):
+            report.append(f"🗓️ {self._window_description(team_data['window'])} ({len(team_data['matches'])} matches)")
+
+        # 1. SQUAD ROTATION ANALYSIS
+        report.append(f"\n🔄 SQUAD ROTATION ANALYSIS")
+        report.append("-" * 50)
+
+        # Group players by role
+        player_roles = defaultdict(list)
+        for player_id, data in team_data['player_pool'].items():
+            if data['name'] and data['total_appearances'] > 0: # Only include players who actually appeared
+                player_roles[data['role']].append((player_id, data))
+
+        # Ensure consistent order of roles for display
+        role_order = ["🔵 Key Player", "🟡 Regular Starter", "🟠 Squad Rotation", "⚪ Fringe Player", "⚪ Non-playing"]
+        
+        for role in role_order:
+            players = player_roles.get(role, [])
+            if players:
+                report.append(f"\n{role} ({len(players)} players):")
+                # Sort players within each role for consistent output
+                # Prioritize by starts, then total minutes, then avg_rating
+                sorted_players = sorted(players, key=lambda x: (x[1]['starts'], x[1]['total_minutes'], x[1]['avg_rating']), reverse=True)
+                for player_id, player in sorted_players[:20]: # Limit to top 20 per role for brevity
+                    # Format comprehensive player stats
+                    stats_parts = []
+
+                    # Goals and assists
+                    if player['goals'] > 0 or player['assists'] > 0:
+                        stats_parts.append(f"{player['goals']}G+{player['assists']}A")
+
+                    # Rating
+                    if player['avg_rating'] > 0:
+                        stats_parts.append(f"{player['avg_rating']:.1f}★")
+
+                    # Minutes per game
+                    if player['minutes_per_game'] > 0:
+                        stats_parts.append(f"{player['minutes_per_game']:.0f}min/game")
+
+                    # Substitution info
+                    if player['sub_appearances'] > 0:
+                        sub_info = f"{player['sub_appearances']}Sub"
+                        if player['avg_sub_minute'] > 0:
+                            sub_info += f"@{player['avg_sub_minute']:.0f}'"
+                        stats_parts.append(sub_info)
+
+                    # Recent form
+                    if player['recent_form_avg'] > 0:
+                        stats_parts.append(f"Form:{player['recent_form_avg']:.1f}")
+
+                    stats_display = " | " + " | ".join(stats_parts) if stats_parts else ""
+                    
+                    # Ensure position is displayed properly, handle empty string
+                    position_display = f"({player['primary_position']})" if player['primary_position'] else ""
+
+                    record = (availability or {}).get(player_id)
+                    status_display = f" [{self._availability_note(record)}]" if record else ""
+
+                    report.append(f"  • {player['name']} {position_display}: "
+                                  f"{player['starts']}S+{player['sub_appearances']}Sub ({player['start_rate']:.0f}%){stats_display}{status_display}")
+
+        if availability is not None:
+            report.extend(self._availability_section(team_data, availability))
+
+        # 2. DETAILED FORMATION PERFORMANCE
+        report.append(f"\n📊 DETAILED FORMATION PERFORMANCE")
+        report.append("-" * 60)
+
+        sorted_formations = sorted(
+            team_data['formations'].items(),
+            key=lambda x: x[1]['usage_count'],
+            reverse=True
+        )
+
+        for formation, data in sorted_formations:
+            perf_data = team_data['performance_by_formation'].get(formation, {})
+            report.append(f"\n🏟️ {formation} Formation ({data['usage_count']} matches)")
+            report.append(f"   📈 Record: {data['wins']}W-{data['draws']}D-{data['losses']}L ({data['win_rate']:.1f}% win rate)")
+            report.append(f"   ⚽ Goals: {data['goals_for_avg']:.1f} for, {data['goals_against_avg']:.1f} against per game")
+            report.append(f"   📊 Points per Game: {data['points_per_game']:.2f}")
+
+            if perf_data:
+                report.append(f"   📈 Advanced Stats:")
+                report.append(f"      • xG: {self._stat_text(perf_data, 'avg_xG', '.2f')} per game") 
+                report.append(f"      • Possession: {self._stat_text(perf_data, 'avg_possession', '.1f')}%")
+                report.append(f"      • Shots: {self._stat_text(perf_data, 'avg_shots', '.1f')} per game")
+                report.append(f"      • Shots on Target: {self._stat_text(perf_data, 'avg_shots_on_target', '.1f')} per game")
+                report.append(f"      • Big Chances: {self._stat_text(perf_data, 'avg_big_chances', '.1f')} per game")
+                report.append(f"      • Accurate Passes: {self._stat_text(perf_data, 'avg_accurate_passes', '.0f')} per game")
+                report.append(f"      • Fouls: {self._stat_text(perf_data, 'avg_fouls', '.1f')} per game")
+                report.append(f"      • Corners: {self._stat_text(perf_data, 'avg_corners', '.1f')} per game")
+                report.append(f"      • Style: {perf_data.get('style_profile', 'Unknown')}")
+
+        return "\n".join(report)
+
+    def _window_description(self, window):
+        """'Last 5 home matches since 2024-08-01'-style label for a profile window"""
+        venue = f"{window['venue']} " if window['venue'] else ""
+        label = f"Last {window['last_n']} {venue}matches" if window['last_n'] is not None else f"{venue.capitalize() or 'All '}matches"
+        if window['date_from'] is not None and window['date_to'] is not None:
+            label += f" from {_date_key(window['date_from'])} to {_date_key(window['date_to'])}"
+        elif window['date_from'] is not None:
+            label += f" since {_date_key(window['date_from'])}"
+        elif window['date_to'] is not None:
+            label += f" until {_date_key(window['date_to'])}"
+        return label
+
+    def _availability_section(self, team_data, availability):
+        """Report lines: listed players (unavailable first, by role) and the expected lineup"""
+        lines = ["\n🩺 AVAILABILITY", "-" * 50]
+        role_rank = {role: rank for rank, role in enumerate(
+            ["🔵 Key Player", "🟡 Regular Starter", "🟠 Squad Rotation", "⚪ Fringe Player", "⚪ Non-playing"]
+        )}
+        listed = [
+            (record, team_data['player_pool'][player_id])
+            for player_id, record in availability.items() if player_id in team_data['player_pool']
+        ]
+        listed.sort(key=lambda item: (not item[0]['unavailable'], role_rank.get(item[1]['role'], len(role_rank)), -item[1]['starts']))
+        if not listed:
+            lines.append("  ✅ No squad player listed as injured or suspended")
+        for record, player in listed:
+            position_display = f" ({player['primary_position']})" if player['primary_position'] else ""
+            lines.append(f"  • {player['name']}{position_display} {player['role']}: {self._availability_note(record)}")
+
+        lineup = self.estimate_lineup(team_data, availability)
+        if lineup:
+            lines.append(f"\n📋 Expected lineup ({len(lineup)} available players):")
+            lines.append("  " + ", ".join(
+                f"{player['name']} ({player['primary_position']})" if player['primary_position'] else player['name']
+                for player in lineup
+            ))
+        return lines
+
+
+class SharedResource:
+    """
+    Process-wide value shared by every browser session, loaded once and refreshed in
+    the background. Subclasses supply the _load and _refresh hooks; _refresh does its own
+    change check and returns None when there is nothing new.
+
+    Concurrent callers of a cold start wait for one _load instead of loading again, and
+    after a failed load nobody retries for retry_seconds (get() returns None meanwhile).
+    After ttl_seconds, _refresh runs in a background thread while callers keep the
+    current value. The state lock is never held while loading.
+    """
+
+    def __init__(self, ttl_seconds=900, retry_seconds=60):
+        self.ttl_seconds = ttl_seconds
+        self.retry_seconds = retry_seconds
+        self.value = None
+        self.checked_at = 0.0
+        self.failed_at = None
+        self._refresh_thread = None
+        self._lock = threading.Lock()
+        # Serializes cold-start loads (held while loading, unlike _lock)
+        self._load_lock = threading.Lock()
+
+    def get(self):
+        """Return the shared value (None if it could not be loaded), loading it or scheduling a refresh if needed"""
+        with self._lock:
+            if self.value is not None:
+                if time.monotonic() - self.checked_at >= self.ttl_seconds:
+                    self._start_refresh()
+                return self.value
+            if self._retry_pending():
+                return None
+
+        with self._load_lock:
+            with self._lock:
+                # loaded (or failed) by the caller we waited for
+                if self.value is not None or self._retry_pending():
+                    return self.value
+            value, fresh = self._load()
+            with self._lock:
+                self._store(value)
+                if value is not None and not fresh:
+                    self._start_refresh()
+                return self.value
+
+    def _load(self):
+        """Cold-start load: (value or None on failure, fresh); a value that is not fresh is refreshed right away"""
+        raise NotImplementedError
+
+    def _refresh(self, current):
+        """Background refresh of current: the new value, or None if unchanged or unavailable"""
+        raise NotImplementedError
+
+    def _retry_pending(self):
+        """Whether the last failed load is too recent to try again (caller holds the lock)"""
+        return self.failed_at is not None and time.monotonic() - self.failed_at < self.retry_seconds
+
+    def _start_refresh(self):
+        """Refresh in a background thread (caller holds the lock); callers keep the current value meanwhile"""
+        self.checked_at = time.monotonic()
+        if self._refresh_thread is None or not self._refresh_thread.is_alive():
+            self._refresh_thread = threading.Thread(target=self._refresh_in_background, daemon=True)
+            self._refresh_thread.start()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            current = self.value
+        value = self._refresh(current)
+        with self._lock:
+            self._store(value)
+
+    def _store(self, value):
+        """Swap in a loaded value or record a failed cold start (caller holds the lock)"""
+        if value is not None:
+            self.value = value
+            self.checked_at = time.monotonic()
+            self.failed_at = None
+        elif self.value is None:
+            self.failed_at = time.monotonic()
+
+
+class SharedDataset(SharedResource):
+    """
+    Process-wide, read-only match dataset (an EnhancedTeamTacticalPredictor) shared by
+    every browser session; see SharedResource for the loading and refresh rules.
+
+    The cold start may use the local snapshot. Refreshes re-check the source with a
+    conditional request and only re-download it when its ETag changed.
+    """
+
+    def __init__(self, json_url, ttl_seconds=900, reporter=None, retry_seconds=60):
+        super().__init__(ttl_seconds=ttl_seconds, retry_seconds=retry_seconds)
+        self.json_url = json_url
+        self.reporter = reporter
+
+    @property
+    def analyzer(self):
+        return self.value
+
+    def _load(self):
+        # The local snapshot is only trusted for the cold start; refreshes go to the source
+        return self._load_analyzer(self.reporter, use_snapshot=True), True
+
+    def _refresh(self, current):
+        if not self._source_changed(current):
+            return None
+        # No session to report to from this thread: progress is dropped, errors go to stderr
+        return self._load_analyzer(ConsoleReporter(verbose=False), use_snapshot=False)
+
+    def _load_analyzer(self, reporter, use_snapshot):
+        """A freshly loaded analyzer, or None; sessions keep the old one until their next rerun"""
+        analyzer = EnhancedTeamTacticalPredictor(reporter=reporter)
+        return analyzer if analyzer.load_optimized_data(self.json_url, use_snapshot=use_snapshot) else None
+
+    def _source_changed(self, analyzer):
+        return source_changed(self.json_url, analyzer.source_etag)
+
+
+# Bulk report export. Workers get the parent's analyzer through the pool initializer:
+# under 'fork' (CLI only) it is inherited copy-on-write, otherwise each worker loads a snapshot.
+_worker_state = {}
+
+
+def _init_report_worker(analyzer=None, snapshot_path=None):
+    if analyzer is None:
+        analyzer = EnhancedTeamTacticalPredictor(reporter=ConsoleReporter(verbose=False))
+        # without its data a worker would report "No data found" for every team
+        if not analyzer.load_snapshot(snapshot_path):
+            raise RuntimeError(f"worker could not load {snapshot_path}")
+    _worker_state['analyzer'] = analyzer
+
+
+def _render_reports(analyzer, team_names, include_csv=True, availability=None):
+    """Report text (and player CSV) for a chunk of teams, profiled in one batch pass"""
+    profiles = analyzer.analyze_teams(team_names)
+    results = []
+    for team_name in team_names:
+        team_data = profiles.get(team_name)
+        team_availability = None if availability is None else availability.get(team_name, {})
+        report = (
+            analyzer.create_team_report(team_name, team_data, availability=team_availability)
+            if team_data else f"❌ No data found for {team_name}"
+        )
+        csv_text = (
+            analyzer.create_team_player_table(team_data, availability=team_availability).to_csv(index=False)
+            if include_csv and team_data else None
+        )
+        results.append((team_name, report, csv_text))
+    return results
+
+
+def _render_reports_in_worker(team_names, include_csv, availability=None):
+    return _render_reports(_worker_state['analyzer'], team_names, include_csv, availability)
+
+
+class _ReportSink:
+    """Writes finished reports into a directory, a .zip path or a binary file object (zip)"""
+
+    def __init__(self, output):
+        self.output = output
+        self.archive = None
+        if not isinstance(output, str) or output.endswith('.zip'):
+            self.archive = zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED)
+        else:
+            os.makedirs(output, exist_ok=True)
+
+    def write(self, team_name, report, csv_text):
+        base_name = team_name.replace(' ', '_').replace('/', '_')
+        files = [(f"{base_name}_analysis.txt", report)]
+        if csv_text is not None:
+            files.append((f"{base_name}_data.csv", csv_text))
+        for file_name, content in files:
+            if self.archive is not None:
+                self.archive.writestr(file_name, content)
+            else:
+                with open(os.path.join(self.output, file_name), 'w', encoding='utf-8') as f:
+                    f.write(content)
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+
+def export_team_reports(analyzer, output, team_names=None, workers=None, include_csv=True, progress=None,
+                        availability=None, start_method=None):
+    """
+    Render create_team_report (plus the player CSV) for many teams on a process pool,
+    writing each team's files to `output` as soon as its chunk completes.
+
+    output: a directory, a path ending in .zip, or a writable binary file object (zip).
+    progress: optional callable(done, total) invoked after each written team.
+    availability: optional {team: {player_id: record}} (player_data.PlayerAvailability.by_team)
+    to mark injured/suspended players, see create_team_report.
+    start_method: multiprocessing start method of the pool. By default ('forkserver' where
+    available, else 'spawn') the workers load the data from a temporary snapshot. 'fork'
+    hands them the analyzer directly, but is only safe in a single-threaded process such
+    as the CLI: forking a threaded server (Streamlit) can copy a held lock into a worker.
+    Returns the number of teams written.
+    """
+    team_names = list(team_names or analyzer.team_names)
+    workers = min(workers or os.cpu_count() or 1, max(len(team_names), 1))
+    # Several small chunks per worker keep the pool balanced and results streaming
+    chunk_size = max(1, -(-len(team_names) // (workers * 4)))
+    chunks = [team_names[i:i + chunk_size] for i in range(0, len(team_names), chunk_size)]
+
+    sink = _ReportSink(output)
+    done = 0
+    executor = None
+    snapshot_path = None
+    try:
+        if workers <= 1:
+            finished = (_render_reports(analyzer, chunk, include_csv, availability) for chunk in chunks)
+        else:
+            if start_method is None:
+                start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            context = multiprocessing.get_context(start_method)
+            if start_method == 'fork':
+                initargs = (analyzer, None)
+            else:
+                fd, snapshot_path = tempfile.mkstemp(suffix='.snapshot')
+                os.close(fd)
+                write_snapshot(snapshot_path, analyzer.data, analyzer.team_names)
+                initargs = (None, snapshot_path)
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                           initializer=_init_report_worker, initargs=initargs)
+            futures = [
+                executor.submit(_render_reports_in_worker, chunk, include_csv, None if availability is None else {
+                    team_name: availability[team_name] for team_name in chunk if team_name in availability
+                })
+                for chunk in chunks
+            ]
+            finished = (future.result() for future in as_completed(futures))
+
+        for results in finished:
+            for team_name, report, csv_text in results:
+                sink.write(team_name, report, csv_text)
+                done += 1
+                if progress:
+                    progress(done, len(team_names))
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        sink.close()
+        if snapshot_path:
+            os.remove(snapshot_path)
+    return done
@@ -0,0 +1,73 @@
+import argparse
+import json
+
+import pytest
+import requests
+
+import cli
+from test_team_analysis import make_analyzer, make_league_matches, window_reference
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = tmp_path / 'matches.snapshot'
+    make_analyzer(make_league_matches()).save_snapshot(str(path))
+    return str(path)
+
+
+def test_window_args():
+    args = argparse.Namespace(last=3, since='2025-08-01', until=None, venue='home')
+    assert cli.window_args(args) == {'last_n': 3, 'date_from': '2025-08-01', 'venue': 'home'}
+    assert cli.window_args(argparse.Namespace(last=None, since=None, until=None, venue=None)) == {}
+
+
+def test_windowed_json_output(snapshot, capsys):
+    assert cli.main(['--snapshot', snapshot, '--quiet', '--team', 'SC Verl', '--last', '2', '--venue', 'home',
+                     '--format', 'json']) == 0
+
+    output = json.loads(capsys.readouterr().out)
+    expected = window_reference(make_league_matches(), 'SC Verl', lambda match: match['home_team'] == 'SC Verl')
+    profile = output['SC Verl']['profile']
+    assert profile['matches'] == len(expected['matches']) == 2
+    assert profile['window'] == {'last_n': 2, 'date_from': None, 'date_to': None, 'venue': 'home'}
+    assert profile['formations'].keys() == expected['formations'].keys()
+    assert {player_id: player['starts'] for player_id, player in profile['player_pool'].items()} == \
+        {player_id: player['starts'] for player_id, player in expected['player_pool'].items()}
+    assert "Last 2 home matches" in output['SC Verl']['report']
+
+
+def test_empty_window_reports_no_data(snapshot, capsys):
+    assert cli.main(['--snapshot', snapshot, '--quiet', '--team', 'SC Verl', '--since', '2026-01-01']) == 0
+
+    assert capsys.readouterr().out == "❌ No data found for SC Verl\n"
+
+
+def test_append_does_not_save_fallback_data_as_the_source(monkeypatch, tmp_path, capsys):
+    def unreachable(*args, **kwargs):
+        raise requests.exceptions.ConnectionError("offline")
+
+    monkeypatch.setattr(requests, 'get', unreachable)
+    snapshot_path = tmp_path / 'local.snapshot'
+    monkeypatch.setattr(cli, 'SNAPSHOT_PATH', str(snapshot_path))
+    matchday = tmp_path / 'matchday.json'
+    matchday.write_text(json.dumps(make_league_matches()[:1]), encoding='utf-8')
+
+    assert cli.main(['--source', 'https://example.invalid/data.json', '--quiet', '--append', str(matchday)]) == 0
+
+    assert not snapshot_path.exists()
+    assert "Not updating" in capsys.readouterr().err
+
+
+def test_appending_the_same_file_twice_adds_matches_without_an_id_once(snapshot, tmp_path, capsys):
+    matchday = tmp_path / 'matchday.json'
+    new_matches = [{key: value for key, value in dict(match, date=f'2025-09-2{number}').items() if key != 'match_id'}
+                   for number, match in enumerate(make_league_matches()[:2])]
+    matchday.write_text(json.dumps({'matches': new_matches}), encoding='utf-8')
+
+    for expected in ["2 new, 0 corrected, 0 unchanged", "0 new, 0 corrected, 2 unchanged"]:
+        assert cli.main(['--snapshot', snapshot, '--quiet', '--append', str(matchday)]) == 0
+        assert expected in capsys.readouterr().err
+
+    analyzer = make_analyzer([])
+    assert analyzer.load_snapshot(snapshot)
+    assert len(analyzer.data) == len(make_league_matches()) + 2
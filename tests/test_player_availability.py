@@ -0,0 +1,72 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from player_data import PlayerAvailability, read_player_csv
+from team_analysis import ConsoleReporter, EnhancedTeamTacticalPredictor
+
+PLAYERS_CSV = """league_name,data_type,club,player_name,position,age,injury,reason,until,matches_missed,injured_until
+3. Liga,injuries,SC Verl,Anton Eins,Goalkeeper,25,Knee injury,,,,"Sep 1, 2025"
+3. Liga,injuries,SC Verl,Bernd Zwei,Centre-Back,27,Ankle injury,,,,"Oct 30, 2025"
+3. Liga,suspensions,SC Verl,Carl Drei,Centre-Forward,22,,Red card suspension,"Sep 27, 2025",1.0,
+"""
+
+
+def make_analyzer():
+    players = [
+        {'id': number, 'name': name, 'position': 'GK' if number == 1 else 'ST', 'rating': 7.0, 'minutes': 90}
+        for number, name in enumerate(['Anton Eins', 'Bernd Zwei', 'Carl Drei'], start=1)
+    ]
+    match = {
+        'match_id': '1', 'date': '2025-08-30', 'home_team': 'SC Verl', 'away_team': 'VfL Osnabrück',
+        'home_score': 1, 'away_score': 0, 'home_formation': '4-4-2', 'away_formation': '4-3-3',
+        'home_lineup': players, 'away_lineup': [], 'home_subs': [], 'away_subs': [],
+        'substitutions': {'home': [], 'away': []}, 'stats': {},
+    }
+    analyzer = EnhancedTeamTacticalPredictor(reporter=ConsoleReporter(verbose=False))
+    analyzer._set_match_data([match])
+    analyzer.team_names = sorted(analyzer.team_match_index)
+    return analyzer
+
+
+def test_spells_that_ended_are_dropped(tmp_path):
+    path = tmp_path / "players.csv"
+    path.write_text(PLAYERS_CSV, encoding="utf-8")
+    df, success, message = read_player_csv(str(path))
+    assert success, message
+
+    availability = PlayerAvailability(df, make_analyzer(), as_of=pd.Timestamp('2025-09-15'))
+
+    records = availability.for_team('SC Verl')
+    # Anton's spell ended on Sep 1; Bernd (until Oct 30) and Carl (until Sep 27) are still out
+    assert sorted(records) == [2, 3]
+    assert records[2]['unavailable'] and records[2]['until'] == 'Oct 30, 2025'
+    assert records[3]['status'] == 'suspensions' and records[3]['matches_missed'] == 1
+
+
+def test_no_matching_club_lists_nobody():
+    df = pd.DataFrame({
+        'club': ['Club Brugge KV'], 'player_name': ['Anton Eins'], 'data_type': ['injuries'], 'injury': ['Knee injury']
+    })
+
+    availability = PlayerAvailability(df, make_analyzer())
+
+    assert availability.team_clubs == {}
+    assert availability.by_team == {}
+    assert availability.for_team('SC Verl') == {}
+
+
+def test_missing_reason_and_until_columns():
+    df = pd.DataFrame({
+        'club': ['SC Verl'], 'player_name': ['Anton Eins'], 'data_type': ['injuries'],
+        'injury': [np.nan], 'reason': [np.nan], 'until': [np.nan],
+    })
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', FutureWarning)
+        availability = PlayerAvailability(df, make_analyzer())
+
+    assert availability.for_team('SC Verl') == {
+        1: {'status': 'injuries', 'unavailable': True, 'reason': '', 'until': '', 'matches_missed': None}
+    }
@@ -0,0 +1,61 @@
+import pandas as pd
+
+import player_data
+from player_data import PlayerDataset, preprocess_csv, read_player_csv
+
+DATED_CSV = """league_name,data_type,club,player_name,position,age,injury,player_market_value,reason,since,until,matches_missed,injured_since,injured_until
+Bundesliga,injuries,SC Verl,Anton Eins,Goalkeeper,25,Knee injury,100000.0,,,,,"Sep 1, 2025","Oct 30, 2025"
+Bundesliga,suspensions,SC Verl,Bernd Zwei,Centre-Back,27,,200000.0,Red card suspension,"Sep 20, 2025","Sep 27, 2025",1.0,,
+"""
+
+
+def test_read_player_csv_keeps_spell_dates(tmp_path):
+    path = tmp_path / "players.csv"
+    path.write_text(DATED_CSV, encoding="utf-8")
+
+    df, success, message = read_player_csv(str(path))
+
+    assert success, message
+    expected, _, _ = preprocess_csv(pd.read_csv(path))
+    for col in ['since', 'until', 'injured_since', 'injured_until']:
+        assert df[col].astype(object).where(df[col].notna(), None).tolist() == \
+            expected[col].astype(object).where(expected[col].notna(), None).tolist()
+    assert df['injured_until'].iloc[0] == 'Oct 30, 2025'
+    assert df['until'].iloc[1] == 'Sep 27, 2025'
+
+
+def test_player_dataset_uses_the_cache_and_skips_unchanged_downloads(monkeypatch, tmp_path):
+    fetched = []
+
+    def fetch(source, etag=None):
+        fetched.append(etag)
+        return DATED_CSV.encode('utf-8'), 'etag-1'
+
+    monkeypatch.setattr(player_data, 'fetch_player_csv', fetch)
+    cache_path = str(tmp_path / 'players.feather')
+
+    first = PlayerDataset('players.csv', cache_path=cache_path)
+    df = first.get()
+    assert len(df) == 2 and fetched == [None]
+
+    # a new process starts from the cache and checks the source in the background
+    second = PlayerDataset('players.csv', cache_path=cache_path)
+    cached = second.get()
+    second._refresh_thread.join()
+    assert cached['player_name'].tolist() == df['player_name'].tolist()
+    assert fetched == [None, 'etag-1']
+    # same bytes: the cached table stays
+    assert second.get() is cached
+
+
+def test_player_dataset_keeps_the_table_when_the_source_fails(monkeypatch):
+    monkeypatch.setattr(player_data, 'fetch_player_csv', lambda source, etag=None: (DATED_CSV.encode('utf-8'), None))
+    dataset = PlayerDataset('players.csv', cache_path=None)
+    df = dataset.get()
+
+    def unreachable(source, etag=None):
+        raise OSError("unreachable")
+
+    monkeypatch.setattr(player_data, 'fetch_player_csv', unreachable)
+    assert dataset._refresh(df) is None
+    assert dataset.get() is df
@@ -0,0 +1,126 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from player_data import PlayerFilterEngine, PlayerNameIndex, normalize_name, read_player_csv
+
+SAMPLE_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fdmbl2.csv')
+
+
+@pytest.fixture(scope='module')
+def players():
+    df, success, message = read_player_csv(SAMPLE_CSV)
+    assert success, message
+    return df
+
+
+def mask_filter(df, league='All', data_type='All', club='All', positions=None, age_range=None, value_range=None):
+    """The Player Data tab's filtering before the filter engine: a copy narrowed by one mask per filter"""
+    filtered = df.copy()
+    if league != 'All':
+        filtered = filtered[filtered['league_name'] == league]
+    if data_type != 'All':
+        filtered = filtered[filtered['data_type'] == data_type]
+    if club != 'All':
+        filtered = filtered[filtered['club'] == club]
+    if positions:
+        filtered = filtered[filtered['position'].isin(positions)]
+    if age_range is not None:
+        filtered = filtered[filtered['age'].between(*age_range) | filtered['age'].isna()]
+    if value_range is not None:
+        filtered = filtered[filtered['player_market_value'].between(*value_range) | filtered['player_market_value'].isna()]
+    return filtered
+
+
+@pytest.mark.parametrize('filters', [
+    {},
+    {'league': 'Bundesliga'},
+    {'league': 'Bundesliga', 'data_type': 'injuries'},
+    {'data_type': 'suspensions', 'positions': ['Centre-Back', 'Centre-Forward']},
+    {'club': 'Red Bull Salzburg'},
+    {'league': 'Bundesliga', 'club': 'Red Bull Salzburg'},
+    {'age_range': (20, 25)},
+    {'value_range': (1_000_000, 5_000_000)},
+    {'league': 'Super Lig', 'age_range': (17, 30), 'value_range': (0, 2_000_000), 'positions': ['Goalkeeper']},
+    {'league': 'No Such League'},
+])
+def test_filter_engine_matches_mask_filtering(players, filters):
+    engine = PlayerFilterEngine(players)
+
+    result = engine.filter(**filters)
+
+    expected = mask_filter(players, **filters)
+    assert result.index.tolist() == expected.index.tolist()
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_filter_results_are_memoized(players):
+    engine = PlayerFilterEngine(players, cache_size=2)
+
+    first = engine.filter_positions(league='Bundesliga', positions=['Goalkeeper', 'Centre-Back'])
+    # position order does not matter for the cache key
+    assert engine.filter_positions(league='Bundesliga', positions=['Centre-Back', 'Goalkeeper']) is first
+    engine.filter_positions(data_type='injuries')
+    engine.filter_positions(data_type='suspensions')
+    again = engine.filter_positions(league='Bundesliga', positions=['Goalkeeper', 'Centre-Back'])
+    assert again is not first and np.array_equal(again, first)
+
+
+def make_name_index():
+    index = PlayerNameIndex()
+    index.add('csv', ['Kevin Rüegg', 'Tobias Børkeeiet', 'Lukas Jäger', 'Jäger Lukas', None, 'Lukas  Jäger', 'Jesper Löfgren'])
+    index.add('matches', ['Lukas Jager', 'Martin Ødegaard'], keys=[4711, 4712])
+    return index
+
+
+def test_normalize_name():
+    assert normalize_name('  Kevin   RÜEGG ') == 'kevin ruegg'
+    assert normalize_name('Martin Ødegaard') == 'martin odegaard'
+    assert normalize_name('Łukasz Fabiański') == 'lukasz fabianski'
+    assert normalize_name(None) == ''
+
+
+def test_name_search_folds_case_and_accents():
+    index = make_name_index()
+
+    # the same name with or without accents, spaces or capitals is indexed once
+    assert len(index) == 6
+    assert index.keys('jager', 'csv').tolist() == [2, 3, 5]
+    assert index.keys('JÄGER', 'matches').tolist() == [4711]
+    assert index.keys('ruegg', 'csv').tolist() == [0]
+    assert index.keys('ødeg', 'matches').tolist() == [4712]
+    assert index.keys('rkee', 'csv').tolist() == [1]
+    assert index.keys('x', 'csv').tolist() == []
+    assert index.lookup('lukas jager') == {'csv': [2, 5], 'matches': [4711]}
+
+
+def test_name_search_tolerates_typos():
+    index = make_name_index()
+
+    assert index.keys('lofgran', 'csv').tolist() == [6]
+    assert index.keys('lofgran', 'csv', fuzzy=False).tolist() == []
+    # short queries are only matched exactly
+    assert index.keys('lxk', 'csv').tolist() == []
+
+
+def test_name_search_ranking():
+    index = make_name_index()
+
+    assert index.search('jager') == ['Jäger Lukas', 'Lukas Jäger']
+    assert index.search('lukas jager') == ['Lukas Jäger']
+    # a name is shown as first indexed
+    assert index.search('lukas', source='matches') == ['Lukas Jäger']
+
+
+def test_name_filter_finds_what_str_contains_found(players):
+    engine = PlayerFilterEngine(players)
+
+    for query in ['son', 'Lukas', 'burgess', 'an']:
+        contains = players.index[players['player_name'].str.contains(query, case=False, na=False)]
+        found = engine.filter(search_name=query).index
+        assert set(contains) <= set(found)
+        # extra hits only come from accent folding
+        assert all(normalize_name(query) in normalize_name(name) for name in players.loc[found, 'player_name'])
+    assert engine.filter(search_name='jager')['player_name'].tolist() == ['Lukas Jäger']
@@ -0,0 +1,101 @@
+import threading
+import time
+
+from team_analysis import EnhancedTeamTacticalPredictor, SharedDataset, SharedResource
+
+
+class CountingResource(SharedResource):
+    """Loads and refreshes to the next of results (a value, or None to fail), counting calls"""
+
+    def __init__(self, results, delay=0.0, fresh=True, **kwargs):
+        super().__init__(**kwargs)
+        self.results = list(results)
+        self.delay = delay
+        self.fresh = fresh
+        self.calls = []
+
+    def _next(self, kind):
+        self.calls.append(kind)
+        time.sleep(self.delay)
+        return self.results[min(len(self.calls), len(self.results)) - 1]
+
+    def _load(self):
+        return self._next('load'), self.fresh
+
+    def _refresh(self, current):
+        return self._next('refresh')
+
+
+def test_concurrent_cold_start_loads_once():
+    resource = CountingResource([{'version': 1}], delay=0.2)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(resource.get())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert resource.calls == ['load']
+    assert len(results) == 4 and all(result is resource.value for result in results)
+
+
+def test_failed_load_waits_before_retrying():
+    resource = CountingResource([None, {'version': 1}], retry_seconds=60)
+
+    assert resource.get() is None
+    assert resource.get() is None
+    assert resource.calls == ['load']
+
+    resource.failed_at -= 61
+    assert resource.get() == {'version': 1}
+    assert resource.calls == ['load', 'load']
+
+
+def test_refresh_runs_in_background():
+    resource = CountingResource([{'version': 1}, {'version': 2}], delay=0.3, ttl_seconds=0)
+    first = resource.get()
+
+    started = time.monotonic()
+    assert resource.get() is first
+    assert time.monotonic() - started < 0.2
+    resource._refresh_thread.join()
+    assert resource.calls == ['load', 'refresh']
+    assert resource.get() == {'version': 2}
+
+
+def test_unchanged_refresh_keeps_the_value():
+    resource = CountingResource([{'version': 1}, None], ttl_seconds=0)
+    first = resource.get()
+    resource.get()
+    resource._refresh_thread.join()
+
+    assert resource.value is first and resource.failed_at is None
+
+
+def test_stale_load_is_refreshed_right_away():
+    resource = CountingResource([{'version': 1}, {'version': 2}], fresh=False)
+
+    assert resource.get() == {'version': 1}
+    resource._refresh_thread.join()
+    assert resource.calls == ['load', 'refresh']
+    assert resource.get() == {'version': 2}
+
+
+def test_shared_dataset_only_reloads_a_changed_source(monkeypatch):
+    calls = []
+
+    def load(self, json_url, snapshot_path=None, use_snapshot=True):
+        calls.append(use_snapshot)
+        self.source_etag = 'etag'
+        return True
+
+    monkeypatch.setattr(EnhancedTeamTacticalPredictor, 'load_optimized_data', load)
+    dataset = SharedDataset('source.json')
+    analyzer = dataset.get()
+
+    monkeypatch.setattr(SharedDataset, '_source_changed', lambda self, analyzer: False)
+    assert dataset._refresh(analyzer) is None
+    monkeypatch.setattr(SharedDataset, '_source_changed', lambda self, analyzer: True)
+    assert dataset._refresh(analyzer) is not None
+    # the local snapshot is only used for the cold start
+    assert calls == [True, False]
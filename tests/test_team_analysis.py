@@ -0,0 +1,397 @@
+import json
+import math
+
+import numpy as np
+import pytest
+import requests
+
+import team_analysis
+from team_analysis import (
+    ConsoleReporter, EnhancedTeamTacticalPredictor, JsonArrayStream, export_team_reports, parse_stat_values
+)
+
+
+def make_match(match_id, date, home_stats):
+    player = {'id': '1', 'name': 'Anton Eins', 'position': 'GK', 'rating': 7.0, 'minutes': 90}
+    return {
+        'match_id': match_id, 'date': date, 'home_team': 'SC Verl', 'away_team': 'VfL Osnabrück',
+        'home_score': 2, 'away_score': 1, 'home_formation': '4-4-2', 'away_formation': '4-3-3',
+        'home_lineup': [player], 'away_lineup': [], 'home_subs': [], 'away_subs': [],
+        'substitutions': {'home': [], 'away': []},
+        'stats': {f'home_{key}': value for key, value in home_stats.items()},
+    }
+
+
+def make_analyzer(matches):
+    analyzer = EnhancedTeamTacticalPredictor(reporter=ConsoleReporter(verbose=False))
+    analyzer._set_match_data(matches)
+    analyzer.team_names = sorted(analyzer.team_match_index)
+    return analyzer
+
+
+SQUADS = {
+    'SC Verl': ['Anton Eins', 'Bernd Zwei', 'Carl Drei', 'Dirk Vier'],
+    'VfL Osnabrück': ['Emil Fünf', 'Frank Sechs', 'Gerd Sieben', 'Hans Acht'],
+    'Energie Cottbus': ['Ingo Neun', 'Jens Zehn', 'Kai Elf', 'Lars Zwölf'],
+    'Alemannia Aachen': ['Mats Dreizehn', 'Nils Vierzehn', 'Olaf Fünfzehn', 'Paul Sechzehn'],
+}
+POSITIONS = ['GK', 'CB', 'CM', 'ST']
+
+
+def make_side(team, seed):
+    """Lineup (three starters), bench (one player) and substitution events of one side"""
+    players = [
+        {'id': ''.join(word[0] for word in team.split()) + str(number), 'name': name, 'position': POSITIONS[(number + seed) % 4],
+         'rating': 6.0 + (number * seed) % 3, 'minutes': 90, 'goals': (number + seed) % 2, 'assists': seed % 2,
+         'xG': 0.1 * number}
+        for number, name in enumerate(SQUADS[team])
+    ]
+    # the starter and substitute swap every other match
+    if seed % 2:
+        players[2], players[3] = players[3], players[2]
+    events = [{'player_id': players[3]['id'], 'player_name': players[3]['name'], 'minute': f"{55 + seed}'"}] if seed % 3 else []
+    return players[:3], players[3:], events
+
+
+def make_league_matches():
+    """Eight matches between four teams; Alemannia Aachen never has a formation"""
+    fixtures = [
+        ('SC Verl', 'VfL Osnabrück', '2025-08-02', 2, 1),
+        ('Energie Cottbus', 'Alemannia Aachen', '2025-08-03', 0, 0),
+        ('VfL Osnabrück', 'Energie Cottbus', '2025-08-16', 1, 3),
+        ('Alemannia Aachen', 'SC Verl', '2025-08-17', 1, 1),
+        ('SC Verl', 'Energie Cottbus', '2025-08-30', 0, 2),
+        ('Alemannia Aachen', 'VfL Osnabrück', '2025-08-31', 2, 0),
+        ('Energie Cottbus', 'SC Verl', '2025-09-13', 1, 4),
+        ('VfL Osnabrück', 'Alemannia Aachen', '2025-09-14', 2, 2),
+    ]
+    formations = ['4-4-2', '4-3-3', '3-5-2']
+    matches = []
+    for seed, (home, away, date, home_score, away_score) in enumerate(fixtures, start=1):
+        home_lineup, home_subs, home_events = make_side(home, seed)
+        away_lineup, away_subs, away_events = make_side(away, seed + 1)
+        matches.append({
+            'match_id': str(seed), 'date': date, 'home_team': home, 'away_team': away,
+            'home_score': home_score, 'away_score': away_score,
+            'home_formation': None if home == 'Alemannia Aachen' else formations[seed % 3],
+            'away_formation': None if away == 'Alemannia Aachen' else formations[(seed + 1) % 3],
+            'home_lineup': home_lineup, 'away_lineup': away_lineup, 'home_subs': home_subs, 'away_subs': away_subs,
+            'substitutions': {'home': home_events, 'away': away_events},
+            'stats': {
+                f'{side}_{key}': value
+                for side, offset in (('home', 0), ('away', 1))
+                for key, value in (('ball_possession', f'{45 + 5 * ((seed + offset) % 3)}%'),
+                                   ('total_shots', 8 + (seed + offset) % 5), ('shots_on_target', 3 + seed % 2),
+                                   ('big_chances', 1 + offset), ('accurate_passes', f'{300 + 10 * seed} (80%)'),
+                                   ('fouls_committed', 12 - offset), ('corners', 4 + seed % 3),
+                                   ('expected_goals_xg', 0.5 + 0.25 * ((seed + offset) % 4)))
+            },
+        })
+    return matches
+
+
+def assert_same(actual, expected, path='profile'):
+    """Recursive equality of profiles; floats compared with a tolerance, NaN equal to NaN"""
+    if isinstance(expected, dict):
+        assert isinstance(actual, dict) and list(actual) == list(expected), path
+        for key in expected:
+            assert_same(actual[key], expected[key], f'{path}[{key!r}]')
+    elif isinstance(expected, (list, tuple)):
+        assert len(actual) == len(expected), path
+        for i, (actual_item, expected_item) in enumerate(zip(actual, expected)):
+            assert_same(actual_item, expected_item, f'{path}[{i}]')
+    elif isinstance(expected, float) and math.isnan(expected):
+        assert isinstance(actual, float) and math.isnan(actual), path
+    elif isinstance(expected, (int, float)) and not isinstance(expected, bool):
+        assert actual == pytest.approx(expected), path
+    else:
+        assert actual == expected, path
+
+
+def test_analyze_teams_matches_per_team_profiles():
+    analyzer = make_analyzer(make_league_matches())
+
+    batch = analyzer.analyze_teams(analyzer.team_names)
+
+    assert sorted(batch) == analyzer.team_names == sorted(SQUADS)
+    assert batch['Alemannia Aachen']['formations'] == {}
+    assert all(player['primary_formation'] is None for player in batch['Alemannia Aachen']['player_pool'].values()
+               if player['starts'])
+    for team_name in analyzer.team_names:
+        assert_same(batch[team_name], analyzer.analyze_team_tactical_profile(team_name), team_name)
+    # a subset is profiled from the tables of those teams only
+    subset = analyzer.analyze_teams(['VfL Osnabrück', 'SC Verl'])
+    assert list(subset) == ['SC Verl', 'VfL Osnabrück']
+    assert_same(subset['SC Verl'], batch['SC Verl'])
+
+
+def test_append_matches_equals_full_rebuild():
+    matches = make_league_matches()
+    analyzer = make_analyzer(matches[:5])
+    # warm the caches the delta path has to keep or drop
+    analyzer.analyze_teams()
+    for team_name in analyzer.team_names:
+        analyzer.analyze_team_tactical_profile(team_name)
+        analyzer.analyze_team_tactical_profile(team_name, last_n=2)
+    version = analyzer.data_version
+
+    corrected = dict(matches[1], home_score=3, home_formation='5-3-2')
+    summary = analyzer.append_matches([matches[0], corrected] + matches[5:])
+
+    assert summary == {'added': 3, 'updated': 1, 'unchanged': 1,
+                       'teams': ['Alemannia Aachen', 'Energie Cottbus', 'SC Verl', 'VfL Osnabrück']}
+    assert analyzer.data_version == version + 1
+    rebuilt = make_analyzer([matches[0], corrected] + matches[2:])
+    assert analyzer.team_match_index == rebuilt.team_match_index
+    assert analyzer.team_names == rebuilt.team_names
+    for team_name in rebuilt.team_names:
+        assert_same(analyzer.analyze_team_tactical_profile(team_name),
+                    rebuilt.analyze_team_tactical_profile(team_name), team_name)
+        assert_same(analyzer.analyze_team_tactical_profile(team_name, last_n=2),
+                    rebuilt.analyze_team_tactical_profile(team_name, last_n=2), team_name)
+    assert_same(analyzer.analyze_teams(), rebuilt.analyze_teams())
+
+
+def test_append_matches_drops_teams_left_without_matches():
+    matches = make_league_matches()
+    analyzer = make_analyzer(matches[:2])
+
+    # the only Verl/Osnabrück match is corrected to other team names
+    summary = analyzer.append_matches([dict(matches[0], home_team='SC Verl NEW', away_team='VfL Osnabrück II')])
+
+    assert summary['teams'] == ['SC Verl', 'SC Verl NEW', 'VfL Osnabrück', 'VfL Osnabrück II']
+    rebuilt = make_analyzer([dict(matches[0], home_team='SC Verl NEW', away_team='VfL Osnabrück II'), matches[1]])
+    assert analyzer.team_names == rebuilt.team_names == [
+        'Alemannia Aachen', 'Energie Cottbus', 'SC Verl NEW', 'VfL Osnabrück II'
+    ]
+    assert analyzer.analyze_team_tactical_profile('SC Verl') is None
+
+
+def test_append_matches_keeps_unaffected_profiles():
+    matches = make_league_matches()
+    analyzer = make_analyzer(matches[:4])
+    untouched = analyzer.analyze_team_tactical_profile('VfL Osnabrück')
+
+    # only Energie Cottbus and Alemannia Aachen play in the second match
+    summary = analyzer.append_matches([dict(matches[1], away_score=1)])
+
+    assert summary['teams'] == ['Alemannia Aachen', 'Energie Cottbus']
+    assert analyzer.analyze_team_tactical_profile('VfL Osnabrück') is untouched
+    assert analyzer.append_matches(matches[:2]) == {'added': 0, 'updated': 1, 'unchanged': 1, 'teams': ['Alemannia Aachen', 'Energie Cottbus']}
+
+
+def window_reference(matches, team_name, keep):
+    """Whole-season profile of team_name recomputed from only its matches that keep() accepts"""
+    team_matches = [match for match in matches if team_name in (match['home_team'], match['away_team']) and keep(match)]
+    return make_analyzer(team_matches).analyze_team_tactical_profile(team_name) if team_matches else None
+
+
+@pytest.mark.parametrize('window, keep', [
+    ({'last_n': 2}, lambda match: match['date'] >= '2025-08-30'),
+    ({'last_n': 0}, lambda match: False),
+    ({'date_from': '2025-08-17'}, lambda match: match['date'] >= '2025-08-17'),
+    ({'date_to': '2025-08-30'}, lambda match: match['date'] <= '2025-08-30'),
+    ({'date_from': '2025-08-17', 'date_to': '2025-08-30'}, lambda match: '2025-08-17' <= match['date'] <= '2025-08-30'),
+    ({'venue': 'home'}, lambda match: match['home_team'] == 'SC Verl'),
+    ({'venue': 'away', 'last_n': 1}, lambda match: match['date'] == '2025-09-13'),
+    ({'venue': 'away', 'date_to': '2025-08-17'}, lambda match: match['date'] == '2025-08-17'),
+    ({'date_from': '2025-10-01'}, lambda match: False),
+])
+def test_windowed_profile_matches_filtered_recompute(window, keep):
+    matches = make_league_matches()
+    analyzer = make_analyzer(matches)
+
+    windowed = analyzer.analyze_team_tactical_profile('SC Verl', **window)
+    expected = window_reference(matches, 'SC Verl', keep)
+
+    if expected is None:
+        assert windowed is None
+    else:
+        assert windowed['window'] == {'last_n': None, 'date_from': None, 'date_to': None, 'venue': None, **window}
+        assert_same({key: value for key, value in windowed.items() if key != 'window'}, expected)
+
+
+def test_windowed_sub_rating_rounds_like_the_full_profile():
+    matches = []
+    for number, rating in enumerate([7.8, 7.77], start=1):
+        match = make_match(str(number), f'2025-08-0{number}', {})
+        match['home_subs'] = [{'id': '2', 'name': 'Bernd Zwei', 'position': 'ST', 'rating': rating, 'minutes': 30}]
+        match['substitutions'] = {'home': [{'player_id': '2', 'player_name': 'Bernd Zwei', 'minute': "60'"}], 'away': []}
+        matches.append(match)
+    analyzer = make_analyzer(matches)
+
+    # (7.8 + 7.77) / 2 == 7.785: an average on the rounding boundary
+    full = analyzer.analyze_team_tactical_profile('SC Verl')['substitution_analysis']['2']
+    assert full['avg_rating_as_sub'] == 7.79
+    for window in [{'last_n': 1000}, {'date_from': '2025-08-01'}, {'venue': 'home'}]:
+        windowed = analyzer.analyze_team_tactical_profile('SC Verl', **window)['substitution_analysis']['2']
+        assert windowed['avg_rating_as_sub'] == full['avg_rating_as_sub'], window
+
+
+def test_formation_stat_spread():
+    shots = [10, 14, 21]
+    analyzer = make_analyzer([
+        make_match(str(number), f'2025-08-0{number}', {'total_shots': value, 'ball_possession': '55%' if number == 1 else None})
+        for number, value in enumerate(shots, start=1)
+    ])
+
+    spread = analyzer.analyze_team_tactical_profile('SC Verl')['performance_by_formation']['4-4-2']['stat_spread']
+
+    std = np.std(shots, ddof=1)
+    margin = 4.303 * std / math.sqrt(len(shots))  # two-sided 95% t value for 2 degrees of freedom
+    assert spread['total_shots']['std'] == pytest.approx(std)
+    assert spread['total_shots']['ci95_low'] == pytest.approx(np.mean(shots) - margin)
+    assert spread['total_shots']['ci95_high'] == pytest.approx(np.mean(shots) + margin)
+    # a single possession value: no spread
+    assert all(math.isnan(value) for value in spread['ball_possession'].values())
+
+
+def test_parse_stat_values():
+    values, ratios, unparseable = parse_stat_values([12, '55%', '245 (82%)', None, 'n/a'])
+    assert values[:3].tolist() == [12.0, 55.0, 245.0]
+    assert ratios[1:3].tolist() == [55.0, 82.0]
+    assert math.isnan(values[3]) and not unparseable[3]
+    assert math.isnan(values[4]) and unparseable[4]
+
+
+def test_json_stream_values_split_across_chunks():
+    chunks = ['{"matches": [{"a": 1', '23}, {"b": "x', 'y"}, 4', '56], "ver', 'sion": 2.', '5}  \n']
+
+    assert list(JsonArrayStream(chunks)) == [('matches', {'a': 123}), ('matches', {'b': 'xy'}), ('matches', 456), ('version', 2.5)]
+
+
+@pytest.mark.parametrize('text', ['[1, 2]xyz', '{"matches": []} {}', '[1] ]'])
+def test_json_stream_rejects_extra_data(text):
+    with pytest.raises(json.JSONDecodeError, match="Extra data"):
+        list(JsonArrayStream([text[:3], text[3:]]))
+
+
+def test_unparseable_stat_is_reported_and_shown_as_dash():
+    analyzer = make_analyzer([
+        make_match('1', '2025-08-01', {'ball_possession': 'n/a', 'total_shots': '16'}),
+        make_match('2', '2025-08-08', {'ball_possession': '?', 'total_shots': 14}),
+    ])
+
+    assert [issue['stat'] for issue in analyzer.stat_issues] == ['home_ball_possession', 'home_ball_possession']
+    performance = analyzer.analyze_team_tactical_profile('SC Verl')['performance_by_formation']['4-4-2']
+    assert math.isnan(performance['avg_possession'])
+    assert performance['avg_shots'] == 15.0
+    # no possession: the style falls through to the shot volume
+    assert performance['style_profile'] == "🚀 Direct Attack"
+
+    report = analyzer.create_team_report('SC Verl')
+    assert "Possession: -%" in report
+    assert "nan" not in report
+
+
+def test_cold_start_falls_back_to_bundled_snapshot(monkeypatch, tmp_path):
+    def unreachable(*args, **kwargs):
+        raise requests.exceptions.ConnectionError("offline")
+
+    monkeypatch.setattr(requests, 'get', unreachable)
+    analyzer = EnhancedTeamTacticalPredictor(reporter=ConsoleReporter(verbose=False))
+
+    assert analyzer.load_optimized_data('https://example.invalid/data.json', snapshot_path=str(tmp_path / 'missing.snapshot'))
+    assert analyzer.data and analyzer.team_names
+    assert analyzer.source is None and analyzer.loaded_from.endswith('pkl1.pkl')
+
+    # refreshes (use_snapshot=False) must not swap in the old bundled data
+    refreshed = EnhancedTeamTacticalPredictor(reporter=ConsoleReporter(verbose=False))
+    assert not refreshed.load_optimized_data('https://example.invalid/data.json', snapshot_path=None, use_snapshot=False)
+
+
+class FakeResponse:
+    def __init__(self, status_code, etag=None):
+        self.status_code = status_code
+        self.headers = {'ETag': etag} if etag else {}
+
+
+def saved_snapshot(tmp_path, source, etag):
+    analyzer = make_analyzer(make_league_matches()[:2])
+    analyzer.source_etag = etag
+    path = str(tmp_path / 'local.snapshot')
+    analyzer.save_snapshot(path, source=source)
+    return path
+
+
+def test_revalidated_snapshot_is_used_while_the_etag_holds(monkeypatch, tmp_path):
+    url = 'https://example.invalid/data.json'
+    path = saved_snapshot(tmp_path, url, 'v1')
+    monkeypatch.setattr(requests, 'head', lambda *args, **kwargs: FakeResponse(304))
+    monkeypatch.setattr(requests, 'get', lambda *args, **kwargs: pytest.fail("downloaded an unchanged source"))
+    analyzer = EnhancedTeamTacticalPredictor(reporter=ConsoleReporter(verbose=False))
+
+    assert analyzer.load_optimized_data(url, snapshot_path=path, revalidate_snapshot=True)
+    assert analyzer.loaded_from == path and analyzer.source == url
+
+
+def test_out_of_date_snapshot_beats_the_bundled_one(monkeypatch, tmp_path):
+    url = 'https://example.invalid/data.json'
+    path = saved_snapshot(tmp_path, url, 'v1')
+    downloads = []
+
+    def unreachable(*args, **kwargs):
+        downloads.append(args)
+        raise requests.exceptions.ConnectionError("offline")
+
+    monkeypatch.setattr(requests, 'head', lambda *args, **kwargs: FakeResponse(200, 'v2'))
+    monkeypatch.setattr(requests, 'get', unreachable)
+    analyzer = EnhancedTeamTacticalPredictor(reporter=ConsoleReporter(verbose=False))
+
+    assert analyzer.load_optimized_data(url, snapshot_path=path, revalidate_snapshot=True)
+    assert len(downloads) == 1
+    assert analyzer.loaded_from == path and len(analyzer.data) == 2
+
+
+def test_snapshot_of_another_or_no_source_is_ignored(tmp_path):
+    path = saved_snapshot(tmp_path, None, None)
+    analyzer = EnhancedTeamTacticalPredictor(reporter=ConsoleReporter(verbose=False))
+
+    assert not analyzer.load_snapshot(path, expected_source='https://example.invalid/data.json')
+    assert analyzer.load_snapshot(path)
+
+
+def test_export_team_reports_in_worker_processes(tmp_path):
+    analyzer = make_analyzer(make_league_matches())
+
+    assert export_team_reports(analyzer, str(tmp_path), workers=2, start_method='spawn') == 4
+    assert len(list(tmp_path.glob('*.txt'))) == 4
+
+
+def test_export_fails_when_workers_cannot_load_the_data(monkeypatch, tmp_path):
+    def write_truncated(path, *args, **kwargs):
+        with open(path, 'wb') as f:
+            f.write(b'CMPOSNAP')
+
+    monkeypatch.setattr(team_analysis, 'write_snapshot', write_truncated)
+    analyzer = make_analyzer(make_league_matches())
+
+    with pytest.raises(RuntimeError):
+        export_team_reports(analyzer, str(tmp_path), workers=2, start_method='spawn')
+    assert not list(tmp_path.glob('*.txt'))
+
+
+def test_missing_formation_keeps_primary_formation_none():
+    match = make_match('1', '2025-08-01', {'total_shots': 10})
+    match['home_formation'] = None
+    analyzer = make_analyzer([match])
+
+    assert analyzer.analyze_team_tactical_profile('SC Verl')['player_pool']['1']['primary_formation'] is None
+    windowed = analyzer._compute_windowed_profile('SC Verl', last_n=1)
+    assert windowed['player_pool']['1']['primary_formation'] is None
+
+
+def test_unbounded_window_matches_full_profile_with_missing_positions():
+    matches = [make_match(str(number), f'2025-08-0{number}', {'total_shots': 10}) for number in range(1, 4)]
+    for match, position in zip(matches, [None, None, 'GK']):
+        match['home_lineup'] = [dict(match['home_lineup'][0], position=position),
+                                {'id': '2', 'name': 'Bernd Zwei', 'position': 'ST', 'rating': 6.5, 'minutes': 90}]
+    matches[0]['home_subs'] = [{'id': '3', 'name': 'Carl Drei', 'position': 'ST', 'rating': 0, 'minutes': 0}]
+    analyzer = make_analyzer(matches)
+
+    full = analyzer.analyze_team_tactical_profile('SC Verl')
+    windowed = analyzer.analyze_team_tactical_profile('SC Verl', last_n=10)
+
+    assert full['player_pool']['1']['primary_position'] is None
+    assert windowed['player_pool'] == full['player_pool']
+    assert {key: value for key, value in windowed.items() if key != 'window'} == full